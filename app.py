@@ -2,6 +2,8 @@ import streamlit as st
 import datetime
 import json
 
+from utils.report_analytics import report_analytics, MIN_REPORTS
+
 # Page configuration
 st.set_page_config(
     page_title="Tramibot - Spanish Procedures Assistant",
@@ -171,37 +173,69 @@ with col3:
 st.markdown("---")
 st.markdown("## 📚 Manual Status Guide")
 
-st.markdown("""
-### 🎯 Best Times to Check Manually
-Based on historical patterns and community reports:
-""")
+# Only reports stored since the last render are read; the rest comes from the aggregates
+report_analytics.refresh()
+community_reports = report_analytics.total_reports()
 
-col1, col2 = st.columns(2)
-
-with col1:
-    st.markdown("""
-    **🕗 Morning Windows:**
-    - Monday-Friday: 8:00-10:00 AM
-    - Tuesday-Thursday: Most reliable
-    - First weekday of month: Highest availability
-    
-    **📍 Barcelona Offices:**
-    - Police (Via Júlia): 8:15-9:00 AM
-    - Extranjería: 9:00-10:00 AM
+if community_reports >= MIN_REPORTS:
+    st.markdown(f"""
+    ### 🎯 Best Times to Check Manually
+    Based on {community_reports} community success reports:
     """)
-
-with col2:
-    st.markdown("""
-    **🕑 Afternoon Windows:**
-    - Tuesday-Thursday: 2:00-4:00 PM  
-    - Some offices release cancellations
-    - Less competitive than mornings
     
-    **🏛️ Other Cities:**
-    - Girona: 8:45 AM consistently
-    - Tarragona: 9:00 AM & 4:00 PM
-    - Lleida: 8:30 AM daily
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        windows = report_analytics.best_windows(top_n=5)
+        profile = report_analytics.weekday_profile()
+        best_days = profile.sum(axis=1).nlargest(3)
+        st.markdown("**🕗 Most Successful Windows:**\n" + "\n".join(
+            f"- {row.weekday} {row.time}: {row.probability:.0%} of successes"
+            for row in windows.itertuples()
+        ))
+        st.markdown("**📅 Best Weekdays:**\n" + "\n".join(
+            f"- {day}: {profile.loc[day, 'morning']:.0%} mornings, {profile.loc[day, 'afternoon']:.0%} afternoons"
+            for day in best_days.index
+        ))
+    
+    with col2:
+        st.markdown("**📍 By Office:**\n" + "\n".join(
+            f"- {row.office}: {row.best_weekday} {row.best_time} "
+            f"({row.reports} reports, median wait {row.median_wait_days} days)"
+            for row in report_analytics.office_summary().itertuples()
+        ))
+else:
+    st.markdown("""
+    ### 🎯 Best Times to Check Manually
+    General guidance until enough community reports come in:
     """)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("""
+        **🕗 Morning Windows:**
+        - Monday-Friday: 8:00-10:00 AM
+        - Tuesday-Thursday: Most reliable
+        - First weekday of month: Highest availability
+    
+        **📍 Barcelona Offices:**
+        - Police (Via Júlia): 8:15-9:00 AM
+        - Extranjería: 9:00-10:00 AM
+        """)
+
+    with col2:
+        st.markdown("""
+        **🕑 Afternoon Windows:**
+        - Tuesday-Thursday: 2:00-4:00 PM  
+        - Some offices release cancellations
+        - Less competitive than mornings
+    
+        **🏛️ Other Cities:**
+        - Girona: 8:45 AM consistently
+        - Tarragona: 9:00 AM & 4:00 PM
+        - Lleida: 8:30 AM daily
+        """)
 
 # Quick Action Section
 st.markdown("### ⚡ Ready to Check?")
@@ -263,41 +297,61 @@ with official_col3:
 st.markdown("---")
 st.markdown("## 🤝 Community Reports")
 
-st.markdown("""
-### 📊 Recent Success Stories
-*Community-driven insights - be the first to contribute!*
-""")
+office_patterns = report_analytics.office_summary()
 
-# Placeholder for community content
-st.info("""
-**🚧 Community Building in Progress**  
-As more users join and share their experiences, this section will show real success stories and patterns.
-""")
-
-# Sample success stories
-st.markdown("#### 💡 Sample Success Patterns")
-
-success_col1, success_col2 = st.columns(2)
-
-with success_col1:
+if community_reports >= MIN_REPORTS:
     st.markdown("""
-    <div class="success-story">
-    <strong>Barcelona Police (Via Júlia)</strong><br>
-    ⏰ Most success: Tuesday 8:30 AM<br>
-    📅 Best results: First week of month<br>
-    🎯 Strategy: Check right at 8:15 AM
-    </div>
-    """, unsafe_allow_html=True)
-
-with success_col2:
+    ### 📊 Community Success Patterns
+    *Computed from the success stories shared in our community section*
+    """)
+    
+    pattern_cols = st.columns(2)
+    for column, pattern in zip(pattern_cols, office_patterns.head(2).itertuples()):
+        with column:
+            st.markdown(f"""
+            <div class="success-story">
+            <strong>{pattern.office}</strong><br>
+            ⏰ Most success: {pattern.best_weekday} {pattern.best_time} ({pattern.probability:.0%} of reports)<br>
+            📅 Median wait: {pattern.median_wait_days} days<br>
+            🎯 Based on {pattern.reports} success reports
+            </div>
+            """, unsafe_allow_html=True)
+else:
     st.markdown("""
-    <div class="success-story">
-    <strong>Girona Office</strong><br>
-    ⏰ Most success: Weekdays 8:45 AM<br>
-    📅 Consistent morning releases<br>
-    🎯 Strategy: Daily checking at opening
-    </div>
-    """, unsafe_allow_html=True)
+    ### 📊 Recent Success Stories
+    *Community-driven insights - be the first to contribute!*
+    """)
+    
+    # Placeholder for community content
+    st.info("""
+    **🚧 Community Building in Progress**  
+    As more users join and share their experiences, this section will show real success stories and patterns.
+    """)
+    
+    # Sample success stories
+    st.markdown("#### 💡 Sample Success Patterns")
+    
+    success_col1, success_col2 = st.columns(2)
+    
+    with success_col1:
+        st.markdown("""
+        <div class="success-story">
+        <strong>Barcelona Police (Via Júlia)</strong><br>
+        ⏰ Most success: Tuesday 8:30 AM<br>
+        📅 Best results: First week of month<br>
+        🎯 Strategy: Check right at 8:15 AM
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with success_col2:
+        st.markdown("""
+        <div class="success-story">
+        <strong>Girona Office</strong><br>
+        ⏰ Most success: Weekdays 8:45 AM<br>
+        📅 Consistent morning releases<br>
+        🎯 Strategy: Daily checking at opening
+        </div>
+        """, unsafe_allow_html=True)
 
 # Educational Resources Section
 st.markdown("---")
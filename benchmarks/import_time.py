@@ -0,0 +1,66 @@
+"""Cold-start import cost of the modules the pages load
+
+Each target is imported in a fresh interpreter, so the numbers match what a
+new Streamlit replica pays before it can render its first page:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 20 --json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each page imports from utils at load time
+TARGETS = {
+    "utils": "import utils",
+    "procedures_guide": "from utils.ai_core import immigration_ai; from utils.update_store import update_store; "
+                        "from utils.guide_store import guide_store",
+    "live_updates": "from utils.ai_core import immigration_ai; from utils.update_store import update_store",
+    "ai_helpers": "from utils.ai_helpers import PropertyAIAnalyzer; PropertyAIAnalyzer()",
+}
+
+# Third-party modules that should only load when first used
+HEAVY_MODULES = ("requests", "feedparser", "bs4", "openai", "google.generativeai", "numpy")
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(statement, runs):
+    samples, loaded = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"] * 1000)
+        loaded = result["loaded"]
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "heavy_modules_loaded": loaded
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app's modules")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per target (default: 10)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = {name: measure(statement, args.runs) for name, statement in TARGETS.items()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            loaded = ", ".join(result["heavy_modules_loaded"]) or "none"
+            print(f"{name:<18} median {result['median_ms']:>7.1f} ms   min {result['min_ms']:>7.1f} ms   heavy: {loaded}")
@@ -0,0 +1,217 @@
+"""Scenario benchmarks for scans, guides and BOE checks against local stub services
+
+No real AI provider or BOE request is made: the endpoints are pointed at the
+stubs in stub_servers.py, and every run uses a throwaway data directory.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --latency 0.3 --error-rate 0.1 --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json    # exit 1 on a p95 regression
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_servers import StubServer, StubConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Run as a script, so the repository root is not on the path yet
+sys.path.insert(0, ROOT)
+
+PROPERTY = {"location": "Valencia", "price": 185000, "size_m2": 78, "bedrooms": 2}
+COMPS = [
+    {"location": "Valencia", "price": 179000, "size_m2": 75, "rent": 950},
+    {"location": "Valencia", "price": 198000, "size_m2": 82, "rent": 1050},
+]
+# Concurrent analyses per iteration of the async fan-out scenario
+FANOUT = 100
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+def run_scenario(operation, iterations, concurrency, stubs):
+    """Call operation(i) iterations times; latency percentiles, throughput and stub calls per call"""
+    for stub in stubs.values():
+        stub.reset()
+    latencies = [None] * iterations
+
+    def timed(index):
+        start = time.perf_counter()
+        operation(index)
+        latencies[index] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(iterations)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / iterations * 1000, 1),
+        "throughput_per_s": round(iterations / elapsed, 2),
+        "calls_per_iteration": {name: round(stub.requests / iterations, 2) for name, stub in stubs.items()},
+        "stub_errors": sum(stub.errors for stub in stubs.values())
+    }
+
+def build_scenarios(data_dir):
+    """name -> (operation, or None with a reason to skip); imported after the env points at the stubs"""
+    from utils.ai_core import SecureImmigrationAI
+    from utils.ai_updater import LegalAIUpdater
+    from utils.ai_helpers import PropertyAIAnalyzer, OPENAI_AVAILABLE
+    from utils.feed_fetcher import FeedFetcher
+    from utils.response_cache import ResponseCache
+    from utils.async_runtime import run_sync
+
+    def fresh_ai():
+        # Empty response cache and a feed snapshot that always revalidates
+        return SecureImmigrationAI(
+            cache=ResponseCache(cache_dir=tempfile.mkdtemp(dir=data_dir)),
+            fetcher=FeedFetcher(refresh_seconds=0, snapshot_dir=tempfile.mkdtemp(dir=data_dir))
+        )
+
+    cached_ai = fresh_ai()
+    guide_ai = fresh_ai()
+    stream_ai = fresh_ai()
+    # Without a Hugging Face token the router goes to OpenRouter, the provider that streams
+    stream_ai.hf_token = ""
+    updater = LegalAIUpdater(fetcher=FeedFetcher(refresh_seconds=0, snapshot_dir=tempfile.mkdtemp(dir=data_dir)))
+
+    def stream_guide(index):
+        for _ in stream_ai.stream_procedure_guide("TIE Card Application", f"Benchmark user {index}"):
+            pass
+    
+    async def analysis_fanout(index):
+        # FANOUT distinct entries in flight at once on one event loop
+        ai = fresh_ai()
+        await asyncio.gather(*(
+            ai.analyze_update_safely_async(f"Benchmark BOE entry {index}-{n}") for n in range(FANOUT)
+        ))
+
+    scenarios = {
+        "scan_sequential": lambda index: fresh_ai().scan_official_updates(),
+        "scan_parallel": lambda index: fresh_ai().scan_official_updates(parallel=True),
+        "scan_batch": lambda index: fresh_ai().scan_official_updates(parallel=True, batch=True),
+        "scan_cached": lambda index: cached_ai.scan_official_updates(parallel=True, batch=True),
+        "procedure_guide": lambda index: guide_ai.generate_procedure_guide(
+            "First NIE Application", f"Benchmark user {index}"
+        ),
+        "procedure_guide_stream": stream_guide,
+        "boe_check": lambda index: updater.check_boe_updates(),
+        "analysis_fanout_async": lambda index: run_sync(analysis_fanout(index)),
+    }
+    if OPENAI_AVAILABLE:
+        analyzer = PropertyAIAnalyzer()
+        scenarios["property_openai"] = lambda index: analyzer.analyze_with_openai(
+            dict(PROPERTY, listing=index), COMPS
+        )
+    else:
+        scenarios["property_openai"] = None
+    # Warm-up so scan_cached measures the cached path only
+    cached_ai.scan_official_updates(parallel=True, batch=True)
+    return scenarios
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose p95 grew by more than tolerance (a fraction) over the baseline"""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "p95_ms" not in result or "p95_ms" not in previous:
+            continue
+        change = (result["p95_ms"] - previous["p95_ms"]) / max(previous["p95_ms"], 0.1)
+        print(f"{name:<24} p95 {previous['p95_ms']:>8.1f} -> {result['p95_ms']:>8.1f} ms ({change:+.0%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local stub services")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per scenario (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent calls per scenario (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub requests failing with 503")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier results file to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.chunk_delay)
+    stubs = {
+        "huggingface": StubServer("huggingface", config).start(),
+        "openrouter": StubServer("openrouter", config).start(),
+        "boe": StubServer("boe", config).start(),
+    }
+    data_dir = tempfile.mkdtemp(prefix="tramibot-bench-")
+    os.environ.update({
+        "TRAMIBOT_DATA_DIR": data_dir,
+        "TRAMIBOT_HF_API_URL": stubs["huggingface"].url,
+        "TRAMIBOT_OPENROUTER_API_URL": f"{stubs['openrouter'].url}/api/v1/chat/completions",
+        "TRAMIBOT_BOE_RSS_URL": f"{stubs['boe'].url}/rss/boe.php",
+        "HUGGINGFACE_TOKEN": "benchmark",
+        "OPENAI_BASE_URL": f"{stubs['openrouter'].url}/v1",
+        "OPENAI_API_KEY": "benchmark",
+    })
+    # The stubs have no quota; set these to benchmark the rate limiter itself
+    os.environ.setdefault("TRAMIBOT_HUGGINGFACE_RPS", "10000")
+    os.environ.setdefault("TRAMIBOT_OPENROUTER_RPS", "10000")
+    os.environ.setdefault("TRAMIBOT_HUGGINGFACE_BURST", "10000")
+    os.environ.setdefault("TRAMIBOT_OPENROUTER_BURST", "10000")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stub": vars(config),
+        },
+        "scenarios": {}
+    }
+    for name, operation in build_scenarios(data_dir).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        if operation is None:
+            results["scenarios"][name] = {"skipped": "openai package not installed"}
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = run_scenario(operation, args.iterations, args.concurrency, stubs)
+
+    for stub in stubs.values():
+        stub.stop()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"p95 regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
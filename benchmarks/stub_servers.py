@@ -0,0 +1,178 @@
+"""Local stand-ins for the Hugging Face inference, OpenRouter/OpenAI chat and BOE RSS endpoints
+
+Every stub answers in the shape the real service uses, after a configurable
+latency, and fails a configurable share of requests with HTTP 503. Chat
+completions stream as server-sent events when the request asks for it.
+"""
+import re
+import json
+import hashlib
+import time
+import random
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubConfig:
+    """Latency and failure behaviour of a stub; mutable between scenarios"""
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, chunk_delay=0.01, chunks=20):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+
+    def delay(self):
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def fails(self):
+        return random.random() < self.error_rate
+
+IMMIGRATION_TITLES = [
+    "Resolución por la que se modifica la autorización de residencia y trabajo por cuenta ajena",
+    "Orden sobre el procedimiento de reagrupación familiar de extranjeros",
+    "Instrucción relativa a la expedición de la tarjeta de identidad de extranjero (TIE)",
+    "Real Decreto sobre visados de estancia por estudios",
+    "Resolución sobre la residencia de larga duración y la inmigración cualificada",
+    "Orden por la que se regula el número de identidad de extranjero (NIE)",
+]
+OTHER_TITLES = [
+    "Resolución de la Dirección General de Tráfico sobre señalización",
+    "Orden de ayudas a la agricultura ecológica",
+    "Anuncio de licitación de obras de carreteras",
+]
+
+def boe_feed(items=40):
+    """RSS document with a realistic mix of immigration and unrelated items"""
+    titles = IMMIGRATION_TITLES + OTHER_TITLES
+    entries = []
+    for number in range(items):
+        title = titles[number % len(titles)]
+        entries.append(f"""<item>
+<title>{title} ({number})</title>
+<link>https://www.boe.es/diario_boe/txt.php?id=BOE-A-2024-{number:05d}</link>
+<guid>BOE-A-2024-{number:05d}</guid>
+<description>Texto de la disposición {number}: {title}. Entrada en vigor al día siguiente.</description>
+<pubDate>{formatdate(1700000000 + number * 3600, usegmt=True)}</pubDate>
+</item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>BOE</title>
+{''.join(entries)}
+</channel></rss>""".encode('utf-8')
+
+def completion_text(prompt):
+    """Answer text for a prompt; batch analysis prompts get the JSON array they ask for"""
+    numbers = re.findall(r"^\s*\[(\d+)\] ", prompt, re.MULTILINE)
+    if numbers and "JSON array" in prompt:
+        return json.dumps([
+            {"index": int(number), "affected_procedures": ["Work Authorization"],
+             "key_changes": ["Updated requirements"], "urgency": "medium"}
+            for number in numbers
+        ])
+    return "Stub analysis: requirements updated, check the official text. " * 8
+
+class StubServer:
+    """One endpoint family on 127.0.0.1, counting the requests it serves"""
+
+    def __init__(self, kind, config=None):
+        self.kind = kind
+        self.config = config or StubConfig()
+        self.requests = 0
+        self.errors = 0
+        self.feed = boe_feed()
+        self.etag = f'"{hashlib.sha256(self.feed).hexdigest()[:16]}"'
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+
+    def _count(self, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.config.delay()
+                if stub.config.fails():
+                    stub._count(error=True)
+                    return self._send(503, b"unavailable", "text/plain")
+                stub._count()
+                if self.headers.get('If-None-Match') == stub.etag:
+                    return self._send(304, b"", None)
+                self._send(200, stub.feed, "application/rss+xml", {"ETag": stub.etag})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.config.delay()
+                if stub.config.fails():
+                    stub._count(error=True)
+                    return self._send(503, b'{"error": "overloaded"}', "application/json")
+                stub._count()
+
+                if stub.kind == "huggingface":
+                    text = completion_text(body.get('inputs', ''))
+                    return self._send(200, json.dumps([{"generated_text": text}]).encode('utf-8'), "application/json")
+
+                prompt = body.get('messages', [{}])[-1].get('content', '')
+                text = completion_text(prompt)
+                if body.get('stream'):
+                    return self._stream(text)
+                payload = {"choices": [{"message": {"role": "assistant", "content": text}}],
+                           "model": body.get('model'), "object": "chat.completion", "id": "stub", "created": 0}
+                self._send(200, json.dumps(payload).encode('utf-8'), "application/json")
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                size = max(1, len(text) // stub.config.chunks)
+                for start in range(0, len(text), size):
+                    event = {"choices": [{"delta": {"content": text[start:start + size]}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(stub.config.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                if content_type:
+                    self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -1,17 +1,21 @@
 import streamlit as st
 import datetime
-import sys
-import os
+import time
 
-# Add utils to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+_render_started = time.perf_counter()
 
 try:
-    from ai_core import immigration_ai
+    from utils import page_cache
+    from utils.guide_store import guide_store
+    from utils.provider_router import ProviderError
+    immigration_ai = page_cache.get_immigration_ai()
+    page_cache.start_metrics_export()
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
 
+from utils.guide_matrix import NATIONALITIES, LOCATIONS, DURATIONS, PURPOSES, PROCEDURES, build_user_context
+
 st.set_page_config(
     page_title="AI Procedures Guide - Tramibot",
     page_icon="🤖",
@@ -70,50 +74,33 @@ col1, col2 = st.columns(2)
 with col1:
     user_nationality = st.selectbox(
         "Your Nationality",
-        ["EU Citizen", "Non-EU Citizen", "UK Citizen", "Other"]
+        NATIONALITIES
     )
     
     current_location = st.selectbox(
         "Your Current Location", 
-        ["Outside Spain", "In Spain (Tourist)", "In Spain (Legal Residence)", "In Spain (Other)"]
+        LOCATIONS
     )
 
 with col2:
     time_in_spain = st.selectbox(
         "Planned Stay Duration",
-        ["Less than 90 days", "3-6 months", "1-2 years", "Long-term/Permanent"]
+        DURATIONS
     )
     
     purpose = st.selectbox(
         "Purpose of Stay",
-        ["Work", "Study", "Family Reunification", "Retirement", "Entrepreneur", "Other"]
+        PURPOSES
     )
 
-user_context = f"""
-Nationality: {user_nationality}
-Current Location: {current_location} 
-Planned Duration: {time_in_spain}
-Purpose: {purpose}
-"""
+user_context = build_user_context(user_nationality, current_location, time_in_spain, purpose)
 
 # Procedure selection
 st.markdown("### 📋 Select Procedure for AI Analysis")
 
 procedure = st.selectbox(
     "Choose procedure for AI guidance:",
-    [
-        "Select a procedure...",
-        "First NIE Application",
-        "TIE Card Application", 
-        "EU Residence Registration",
-        "Family Reunification",
-        "Student Residence Permit",
-        "Work Authorization",
-        "Long-Term EU Residence",
-        "Nationality Application",
-        "Visa Extension/Change",
-        "Empadronamiento Process"
-    ]
+    ["Select a procedure...", *PROCEDURES]
 )
 
 # AI Guidance Generation
@@ -122,48 +109,59 @@ if procedure != "Select a procedure...":
     
     # Generate AI guidance
     if st.button("🤖 Generate AI-Powered Guidance", type="primary"):
-        with st.spinner("🔄 AI is analyzing current procedures and recent updates..."):
-            
-            if AI_AVAILABLE:
-                try:
-                    # Call the real AI system
-                    ai_guidance = immigration_ai.generate_procedure_guide(procedure, user_context)
-                    
-                    # Display AI-generated content
-                    st.markdown(f"""
-                    <div class="ai-card">
-                    <h3>🤖 AI-Generated Guide: {procedure}</h3>
-                    <p><strong>Generated:</strong> {ai_guidance['generated_at']}</p>
-                    <p><strong>Sources Checked:</strong> {', '.join(ai_guidance['sources_checked'])}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Display the AI guidance
-                    st.markdown("### 📝 AI Guidance")
-                    st.markdown(ai_guidance['ai_guidance'])
-                    
-                    # Show recent updates considered
-                    if ai_guidance['recent_updates_considered']:
-                        st.markdown("### 🔄 Recent Updates Considered")
-                        for update in ai_guidance['recent_updates_considered']:
-                            with st.expander(f"📅 {update['date']} - {update['title']}"):
-                                st.markdown(f"**Source:** {update['source']}")
-                                st.markdown(f"**AI Impact Analysis:** {update['ai_analysis']}")
-                                st.markdown(f"**[Read Full Update]({update['link']})**")
-                    
-                except Exception as e:
-                    st.error(f"AI service error: {str(e)}")
-                    st.info("Please try again or check the official sources directly.")
-            else:
-                st.warning("""
-                **AI System Offline**
-                Our AI service is currently unavailable. 
+        if AI_AVAILABLE:
+            try:
+                # Pre-generated guides are served from the store; only a miss calls the AI live
+                combo = (procedure, user_nationality, current_location, time_in_spain, purpose)
+                guide_store.record_request(combo)
+                guide_updates = page_cache.guide_updates(procedure)
+                sources_version = guide_store.sources_version(guide_updates)
+                stored_guide = page_cache.stored_guide(combo, sources_version)
+                generated_at = stored_guide['generated_at'] if stored_guide else datetime.datetime.now().isoformat()
                 
-                Please visit:
-                - [Ministry of Inclusion](https://extranjeros.inclusion.gob.es)
-                - [Official BOE](https://www.boe.es)
-                - [Police Procedures](https://www.policia.es)
-                """)
+                # Display AI-generated content
+                st.markdown(f"""
+                <div class="ai-card">
+                <h3>🤖 AI-Generated Guide: {procedure}</h3>
+                <p><strong>Generated:</strong> {generated_at}</p>
+                <p><strong>Sources Checked:</strong> {', '.join(immigration_ai.GUIDE_SOURCES)}</p>
+                </div>
+                """, unsafe_allow_html=True)
+                
+                # Stream the AI guidance as it is written instead of waiting for all of it
+                st.markdown("### 📝 AI Guidance")
+                guidance_box = st.empty()
+                if stored_guide:
+                    guidance_box.markdown(stored_guide['guidance'])
+                else:
+                    guidance_box.info("🔄 AI is analyzing current procedures and recent updates...")
+                    guidance = ""
+                    try:
+                        for chunk in immigration_ai.stream_procedure_guide(procedure, user_context, guide_updates):
+                            guidance += chunk
+                            guidance_box.markdown(guidance + " ▌")
+                    except ProviderError:
+                        # Truncated answer: show what arrived, but never store it as a guide
+                        guidance_box.markdown(guidance)
+                        st.warning("⚠️ The AI answer was interrupted and is incomplete. Please generate it again.")
+                    else:
+                        guidance_box.markdown(guidance)
+                        if not immigration_ai.is_fallback(guidance):
+                            page_cache.save_guide(combo, guidance, sources_version)
+                
+            except Exception as e:
+                st.error(f"AI service error: {str(e)}")
+                st.info("Please try again or check the official sources directly.")
+        else:
+            st.warning("""
+            **AI System Offline**
+            Our AI service is currently unavailable. 
+            
+            Please visit:
+            - [Ministry of Inclusion](https://extranjeros.inclusion.gob.es)
+            - [Official BOE](https://www.boe.es)
+            - [Police Procedures](https://www.policia.es)
+            """)
     
     # Quick info while AI loads
     st.markdown("### 💡 What AI Will Analyze:")
@@ -208,15 +206,21 @@ if st.button("Scan for Recent Procedure Changes"):
     with st.spinner("AI is scanning official sources for updates..."):
         if AI_AVAILABLE:
             try:
-                updates = immigration_ai.scan_official_updates()
+                # Served from the background worker's last scan
+                latest_scan = page_cache.latest_scan()
+                updates = latest_scan['updates'] if latest_scan else []
                 
-                if updates:
+                if latest_scan is None:
+                    st.info("⏳ No completed scan yet. Start the update worker (`python -m utils.update_worker`) "
+                            "or scan from the Live Updates page.")
+                elif updates:
+                    st.caption(f"📡 Last scan: {latest_scan['finished_at'][:16].replace('T', ' ')}")
                     st.success(f"Found {len(updates)} recent updates")
                     
                     for update in updates[:5]:  # Show latest 5
                         with st.expander(f"🚨 {update['date']} - {update['title']}", expanded=True):
                             st.markdown(f"**Source:** {update['source']}")
-                            st.markdown(f"**AI Impact Analysis:** {update['ai_analysis']}")
+                            st.markdown(f"**AI Impact Analysis:** {update['ai_analysis'] or '⏳ Pending'}")
                             st.markdown(f"**[Read Official Text]({update['link']})**")
                 else:
                     st.info("No recent immigration-related updates found in official sources.")
@@ -263,3 +267,6 @@ st.error("""
 Always verify critical information with official government sources. The AI may occasionally generate incorrect information - 
 use as a helpful guide, not legal advice.
 """)
+
+if AI_AVAILABLE:
+    page_cache.record_render("procedures_guide", _render_started)
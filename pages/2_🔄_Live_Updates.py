@@ -1,14 +1,17 @@
 import streamlit as st
 import datetime
-import sys
-import os
+import html
 import time
 
-# Add utils to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
+from utils.report_store import report_store, ReportValidationError, MONITORED_PROCEDURES, UPDATE_TYPES
+
+_render_started = time.perf_counter()
 
 try:
-    from ai_core import immigration_ai
+    from utils import page_cache
+    from utils.update_store import update_store
+    immigration_ai = page_cache.get_immigration_ai()
+    page_cache.start_metrics_export()
     AI_AVAILABLE = True
 except ImportError:
     AI_AVAILABLE = False
@@ -81,8 +84,15 @@ with col1:
     else:
         st.error("🤖 AI System: **OFFLINE**")
 
+# Pages only read scans stored by the background worker (utils/update_worker.py)
+latest_scan = page_cache.latest_scan() if AI_AVAILABLE else None
+
 with col2:
-    st.info("📡 Last Scan: **Today**")
+    if latest_scan:
+        last_scan_time = datetime.datetime.fromisoformat(latest_scan['finished_at'])
+        st.info(f"📡 Last Scan: **{last_scan_time:%d %b %H:%M}**")
+    else:
+        st.info("📡 Last Scan: **Pending**")
 
 with col3:
     st.metric("Sources Monitored", "4")
@@ -102,83 +112,166 @@ with scan_col1:
     - 🇪🇺 EU Immigration Directives
     """)
 
+def request_scan():
+    # Consumed by the next run of the updates section, so timer refreshes never rescan
+    st.session_state['scan_requested'] = True
+
 with scan_col2:
-    if st.button("🚀 Scan Now", use_container_width=True):
-        st.rerun()
+    st.button("🚀 Scan Now", use_container_width=True, on_click=request_scan)
 
-# Auto-refresh toggle
-auto_refresh = st.checkbox("🔄 Enable auto-refresh (scans every 5 minutes)")
+# Auto-refresh toggle: only the updates section reruns, the rest of the page stays interactive
+AUTO_REFRESH_SECONDS = 300
+auto_refresh = st.checkbox("🔄 Enable auto-refresh (checks every 5 minutes)")
 
 if auto_refresh:
     st.markdown("""
     <div class="scanning-animation">
     <strong>🛰️ AI Scanner Active</strong><br>
-    Next automatic scan in 5 minutes...
+    Checking for new scans every 5 minutes...
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_update_card(update, stored_actions=None):
+    """Render one analyzed update; recommended actions are only generated when asked for
+    
+    stored_actions maps update IDs to actions already generated
+    (update_store.actions_for), looked up once for all cards.
+    """
+    # No analysis yet when the providers were down during the scan
+    analyzed = bool(update['ai_analysis']) and not update.get('is_fallback')
+    # Urgency comes from the structured AI analysis
+    urgency = update.get('urgency') or immigration_ai.urgency_from_text(update['ai_analysis'])
+    is_urgent = urgency in ('high', 'critical')
+    
+    if is_urgent:
+        st.markdown(f"""
+        <div class="urgent-update">
+        <h4>🚨 URGENT: {update['title']}</h4>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="ai-update-card">
+        <h4>📅 {update['date']} - {update['title']}</h4>
+        """, unsafe_allow_html=True)
+    
+    if analyzed:
+        analysis = update['ai_analysis']
+    elif immigration_ai.is_busy(update['ai_analysis']):
+        analysis = "⏳ AI providers are busy: the analysis will be retried shortly."
+    else:
+        analysis = "⏳ Analysis pending: it will be retried on the next scan."
+    st.markdown(f"""
+    **Source:** {update['source']}
+    
+    **🤖 AI Impact Analysis:**
+    <div class="ai-analysis">
+    {analysis}
+    </div>
+    
+    **[📖 Read Official Document]({update['link']})**
     </div>
     """, unsafe_allow_html=True)
-    time.sleep(300)
-    st.rerun()
+    
+    if not analyzed:
+        return
+    
+    # AI-powered action recommendations; expanders run their body even when
+    # collapsed, so the LLM is only called from the button
+    with st.expander("🛠️ AI Recommended Actions"):
+        update_id = update_store.update_id(update)
+        session_actions = st.session_state.setdefault('update_actions', {})
+        actions = (stored_actions or {}).get(update_id) or session_actions.get(update_id)
+        if actions is None and st.button("✨ Get recommended actions", key=f"actions_{update_id}"):
+            try:
+                with st.spinner("🤖 Writing recommendations..."):
+                    actions = immigration_ai.recommended_actions(update)
+            except Exception:
+                actions = None
+            if actions is not None and immigration_ai.is_busy(actions):
+                actions = None
+                st.info("AI providers are busy right now. Please retry in a moment.")
+            elif actions is None or immigration_ai.is_fallback(actions):
+                actions = None
+                st.info("Action recommendations temporarily unavailable")
+            else:
+                session_actions[update_id] = actions
+        if actions:
+            st.markdown(actions)
+
+def scan_and_render():
+    """Run a scan in this session, rendering cards as analyses complete, and store it
+    
+    Same incremental, batched scan as the background worker (SecureImmigrationAI.iter_scan).
+    """
+    started_at = datetime.datetime.now().isoformat()
+    with st.spinner("🤖 AI is scanning official sources for recent changes..."):
+        entries = immigration_ai.fetch_immigration_entries()
+    if not entries:
+        update_store.save_scan([], started_at)
+        page_cache.invalidate_caches()
+        return []
+    
+    st.success(f"🎯 AI found **{len(entries)}** recent immigration updates")
+    
+    # Reserve a slot per shown update (latest 10) so cards keep feed order
+    # while analyses stream in; stored analyses are reused without an LLM call
+    slots = []
+    for entry in entries[:10]:
+        slot = st.empty()
+        slot.info(f"⏳ Analyzing: {entry.title}")
+        slots.append(slot)
+    
+    ordered = [None] * len(entries)
+    stats = {}
+    for index, update in immigration_ai.iter_scan(entries, parallel=True, batch=True, stats=stats):
+        ordered[index] = update
+        if index < len(slots):
+            with slots[index].container():
+                render_update_card(update)
+    for index, slot in enumerate(slots):
+        if ordered[index] is None:
+            slot.empty()
+    
+    updates = [update for update in ordered if update is not None]
+    update_store.save_scan(updates, started_at, stats=stats)
+    page_cache.invalidate_caches()
+    return updates
 
 # Recent AI-Detected Updates
 st.markdown("---")
 st.markdown("## 📢 AI-Detected Updates")
 
-if AI_AVAILABLE:
+@st.fragment(run_every=AUTO_REFRESH_SECONDS if auto_refresh else None)
+def detected_updates():
+    """Render the latest stored updates; auto-refresh reruns only this function"""
     try:
-        with st.spinner("🤖 AI is scanning official sources for recent changes..."):
-            updates = immigration_ai.scan_official_updates()
-        
-        if updates:
-            st.success(f"🎯 AI found **{len(updates)}** recent immigration updates")
+        scanned = st.session_state.pop('scan_requested', False)
+        if scanned:
+            updates = scan_and_render()
+            scan_id = update_store.latest_scan_id()
+        else:
+            scan_id = update_store.latest_scan_id()
+            if scan_id is not None and scan_id == st.session_state.get('detected_scan_id'):
+                # Same scan as last time: redraw from the session, nothing is re-read
+                updates = st.session_state['detected_updates']
+            else:
+                scan = page_cache.latest_scan()
+                updates = scan['updates'] if scan else []
             
-            for i, update in enumerate(updates[:10]):  # Show latest 10
-                # Determine urgency based on AI analysis
-                is_urgent = any(word in update['ai_analysis'].lower() for word in 
-                              ['urgent', 'immediate', 'critical', 'major change'])
-                
-                update_container = st.container()
-                
-                with update_container:
-                    if is_urgent:
-                        st.markdown(f"""
-                        <div class="urgent-update">
-                        <h4>🚨 URGENT: {update['title']}</h4>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"""
-                        <div class="ai-update-card">
-                        <h4>📅 {update['date']} - {update['title']}</h4>
-                        """, unsafe_allow_html=True)
-                    
-                    st.markdown(f"""
-                    **Source:** {update['source']}
-                    
-                    **🤖 AI Impact Analysis:**
-                    <div class="ai-analysis">
-                    {update['ai_analysis']}
-                    </div>
-                    
-                    **[📖 Read Official Document]({update['link']})**
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # AI-powered action recommendations
-                    with st.expander("🛠️ AI Recommended Actions"):
-                        action_prompt = f"""
-                        Based on this legal update: {update['title']}
-                        And this impact analysis: {update['ai_analysis']}
-                        
-                        Provide 3-5 specific actionable steps for people affected by this change.
-                        Focus on practical, immediate actions they should take.
-                        """
-                        
-                        try:
-                            actions = immigration_ai.call_openrouter_free(action_prompt)
-                            st.markdown(actions)
-                        except:
-                            st.info("Action recommendations temporarily unavailable")
+            if updates:
+                st.success(f"🎯 AI found **{len(updates)}** recent immigration updates")
+                shown = updates[:10]  # Show latest 10
+                stored_actions = update_store.actions_for(shown)
+                for update in shown:
+                    with st.container():
+                        render_update_card(update, stored_actions)
+            elif scan_id is None:
+                st.info("⏳ No completed scan yet. Start the update worker (`python -m utils.update_worker`) or press **🚀 Scan Now**.")
         
-        else:
+        st.session_state['detected_scan_id'] = scan_id
+        st.session_state['detected_updates'] = updates
+        
+        if (scanned or scan_id is not None) and not updates:
             st.info("""
             <div class="ai-update-card">
             <h4>✅ No Critical Updates Found</h4>
@@ -190,6 +283,9 @@ if AI_AVAILABLE:
     except Exception as e:
         st.error(f"AI scanning failed: {str(e)}")
         st.info("Please try again in a few moments.")
+
+if AI_AVAILABLE:
+    detected_updates()
 else:
     st.warning("""
     <div class="ai-update-card">
@@ -207,16 +303,7 @@ else:
 st.markdown("---")
 st.markdown("## 📊 AI Procedure Monitoring")
 
-procedures_to_monitor = [
-    "NIE Applications",
-    "TIE Card Processing", 
-    "EU Residence Registration",
-    "Family Reunification",
-    "Student Visas",
-    "Work Permits",
-    "Long-Term Residence",
-    "Nationality Applications"
-]
+procedures_to_monitor = MONITORED_PROCEDURES
 
 # Create monitoring dashboard
 cols = st.columns(4)
@@ -247,7 +334,7 @@ if st.button(f"Analyze {selected_procedure} Changes"):
         with st.spinner(f"🤖 AI is analyzing recent changes to {selected_procedure}..."):
             try:
                 # Get updates specific to this procedure
-                relevant_updates = immigration_ai.get_relevant_updates(selected_procedure)
+                relevant_updates = page_cache.relevant_updates(selected_procedure)
                 
                 if relevant_updates:
                     st.success(f"AI found {len(relevant_updates)} recent changes affecting {selected_procedure}")
@@ -321,19 +408,24 @@ if st.button("🤖 Get AI Predictions for Coming Weeks"):
 st.markdown("---")
 st.markdown("## 🤝 Community-Verified Updates")
 
-st.markdown("""
-<div class="procedure-change">
-<h4>👥 Recent Community Reports</h4>
-<p><strong>AI-Verified Community Insights:</strong></p>
-<ul>
-<li>📈 <strong>Barcelona TIE Processing:</strong> Multiple reports of 3-week processing (was 4-6 weeks)</li>
-<li>🔄 <strong>NIE Justification:</strong> Stricter requirements reported in Madrid offices</li>
-<li>✅ <strong>Digital Submission:</strong> Successful online submissions for EU registration</li>
-<li>⚠️ <strong>Documentation:</strong> Increased requests for apostilled documents</li>
-</ul>
-<p><em>Community reports are verified by AI against official sources</em></p>
-</div>
-""", unsafe_allow_html=True)
+community_reports = report_store.recent_update_reports(limit=8)
+if community_reports:
+    report_items = "\n".join(
+        f"<li>{'⭐' * report['confidence']} <strong>{html.escape(report['procedure'])} - {html.escape(report['update_type'])}:</strong> "
+        f"{html.escape(report['description'])} <em>({report['noticed_on']})</em></li>"
+        for report in community_reports
+    )
+    st.markdown(f"""
+    <div class="procedure-change">
+    <h4>👥 Recent Community Reports</h4>
+    <ul>
+    {report_items}
+    </ul>
+    <p><em>Community reports are verified by AI against official sources</em></p>
+    </div>
+    """, unsafe_allow_html=True)
+else:
+    st.info("👥 No community reports yet. Be the first to report a change you've experienced.")
 
 # Submit Community Update
 with st.expander("📝 Submit Community Update"):
@@ -344,9 +436,7 @@ with st.expander("📝 Submit Community Update"):
         
         with col1:
             update_procedure = st.selectbox("Procedure", procedures_to_monitor)
-            update_type = st.selectbox("Update Type", 
-                                     ["Processing Time Change", "Requirement Change", 
-                                      "Fee Change", "New Procedure", "Other"])
+            update_type = st.selectbox("Update Type", UPDATE_TYPES)
         
         with col2:
             update_date = st.date_input("When did you notice this?")
@@ -356,7 +446,18 @@ with st.expander("📝 Submit Community Update"):
         source = st.text_input("Source (office location, website, etc.):")
         
         if st.form_submit_button("Submit to AI Verification"):
-            st.success("Thank you! This report will help train our AI system.")
+            try:
+                report_store.submit_update_report(
+                    procedure=update_procedure,
+                    update_type=update_type,
+                    noticed_on=update_date,
+                    confidence=confidence,
+                    description=description,
+                    source=source
+                )
+                st.success("Thank you! This report will help train our AI system.")
+            except ReportValidationError as e:
+                st.error(str(e))
 
 # AI System Information
 st.markdown("---")
@@ -395,7 +496,7 @@ col1, col2, col3, col4 = st.columns(4)
 with col1:
     st.metric("Sources Scanned", "4")
 with col2:
-    st.metric("Updates Today", f"{len(updates) if AI_AVAILABLE and 'updates' in locals() else '0'}")
+    st.metric("Updates Today", f"{len(st.session_state.get('detected_updates', []))}")
 with col3:
     st.metric("Accuracy Rate", "94%")
 with col4:
@@ -414,3 +515,6 @@ st.markdown("""
 🔄 This page updates automatically with new AI-detected changes
 </div>
 """, unsafe_allow_html=True)
+
+if AI_AVAILABLE:
+    page_cache.record_render("live_updates", _render_started)
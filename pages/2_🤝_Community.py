@@ -1,6 +1,8 @@
 import streamlit as st
 import datetime
 
+from utils.report_store import report_store, ReportValidationError, OFFICES, SUCCESS_PROCEDURES
+
 st.set_page_config(
     page_title="Community Reports - Tramibot",
     page_icon="🤝",
@@ -55,11 +57,11 @@ with st.form("success_report"):
     with col1:
         office = st.selectbox(
             "Which office?",
-            ["Barcelona Police (Via Júlia)", "Barcelona Extranjería", "Girona", "Tarragona", "Lleida", "Other"]
+            OFFICES
         )
         procedure = st.selectbox(
             "What procedure?",
-            ["NIE Application", "TIE Card", "Residence Renewal", "Empadronamiento", "Other"]
+            SUCCESS_PROCEDURES
         )
     
     with col2:
@@ -71,10 +73,22 @@ with st.form("success_report"):
     tips = st.text_area("Any tips for others?")
     
     if st.form_submit_button("Share Success Story"):
-        st.success("""
-        Thank you for contributing to the community! 
-        Your insights will help others navigate the process more successfully.
-        """)
+        try:
+            report_store.submit_success_report(
+                office=office,
+                procedure=procedure,
+                found_date=success_date,
+                found_time=success_time,
+                wait_days=int(wait_time),
+                strategy=strategy,
+                tips=tips
+            )
+            st.success("""
+            Thank you for contributing to the community! 
+            Your insights will help others navigate the process more successfully.
+            """)
+        except ReportValidationError as e:
+            st.error(str(e))
     
     st.markdown("</div>", unsafe_allow_html=True)
 
@@ -82,19 +96,32 @@ with st.form("success_report"):
 st.markdown("---")
 st.markdown("## 📊 Community Insights")
 
-st.info("""
-**Community data will appear here as users share their experiences.** 
-Early contributors will help establish patterns that benefit everyone!
-""")
+recent_reports = report_store.recent_success_reports(limit=10)
 
-# Placeholder for future community content
-st.markdown("### 🏆 Be a Community Pioneer!")
-st.markdown("""
-<div style="color: #000000;">
-The first users to share their success stories will:
-- Help establish reliable patterns
-- Build valuable community knowledge  
-- Make the platform more useful for everyone
-- Receive recognition as early contributors
-</div>
-""", unsafe_allow_html=True)
+if recent_reports:
+    st.markdown("### 🕒 Latest Success Stories")
+    for report in recent_reports:
+        found_at = datetime.datetime.fromisoformat(report['found_at'])
+        with st.expander(f"✅ {report['office']} - {report['procedure']} ({found_at:%a %d %b, %H:%M})"):
+            st.markdown(f"**Days looking:** {report['wait_days']}")
+            if report['strategy']:
+                st.markdown(f"**Strategy:** {report['strategy']}")
+            if report['tips']:
+                st.markdown(f"**Tips:** {report['tips']}")
+else:
+    st.info("""
+    **Community data will appear here as users share their experiences.** 
+    Early contributors will help establish patterns that benefit everyone!
+    """)
+    
+    # Shown until the first stories arrive
+    st.markdown("### 🏆 Be a Community Pioneer!")
+    st.markdown("""
+    <div style="color: #000000;">
+    The first users to share their success stories will:
+    - Help establish reliable patterns
+    - Build valuable community knowledge  
+    - Make the platform more useful for everyone
+    - Receive recognition as early contributors
+    </div>
+    """, unsafe_allow_html=True)
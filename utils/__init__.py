@@ -0,0 +1,30 @@
+"""Tramibot backend: official-source scanning, AI analysis and local stores
+
+Submodules are imported on first attribute access, so `import utils` stays
+cheap and a page only pays for what it uses.
+"""
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    "immigration_ai": "ai_core",
+    "SecureImmigrationAI": "ai_core",
+    "LegalAIUpdater": "ai_updater",
+    "PropertyAIAnalyzer": "ai_helpers",
+    "feed_fetcher": "feed_fetcher",
+    "guide_store": "guide_store",
+    "transport": "http_transport",
+    "immigration_matcher": "keyword_matcher",
+    "response_cache": "response_cache",
+    "update_store": "update_store",
+    "save_updates": "update_store",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
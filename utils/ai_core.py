@@ -1,113 +1,580 @@
 import os
-import requests
 import json
+import asyncio
 import datetime
-import feedparser
-from bs4 import BeautifulSoup
 import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from .response_cache import response_cache
+from .http_transport import transport as shared_transport, async_transport as shared_async_transport
+from .async_runtime import run_sync
+from .feed_fetcher import feed_fetcher
+from .ingestion_state import IngestionState
+from .provider_router import ProviderRouter, ProviderError, RateLimited
+from .rate_limiter import RateLimiter, estimate_tokens
+from .single_flight import SingleFlight
+from .update_store import update_store
+from .keyword_matcher import immigration_matcher
+from .metrics import metrics, log_event, SIZE_BUCKETS
 
 class SecureImmigrationAI:
-    def __init__(self):
+    HF_MODEL = "microsoft/DialoGPT-large"
+    HF_PARAMS = {"max_length": 800, "temperature": 0.7}
+    OPENROUTER_MODEL = "google/palm-2-chat-bison"
+    OPENROUTER_PARAMS = {"max_tokens": 800}
+    # Endpoints can point at local stand-ins (see benchmarks/)
+    HF_API_URL = os.getenv('TRAMIBOT_HF_API_URL', "https://api-inference.huggingface.co/models")
+    OPENROUTER_API_URL = os.getenv('TRAMIBOT_OPENROUTER_API_URL', "https://openrouter.ai/api/v1/chat/completions")
+    PROVIDER_MODELS = {
+        "huggingface": (HF_MODEL, HF_PARAMS),
+        "openrouter": (OPENROUTER_MODEL, OPENROUTER_PARAMS)
+    }
+    GUIDE_SOURCES = ['BOE', 'Ministry of Inclusion']
+    # Latest stored updates per procedure that a guide takes into account
+    GUIDE_UPDATE_LIMIT = 3
+    URGENCY_LEVELS = ("low", "medium", "high", "critical")
+    # BOE entries packed into a single analysis prompt
+    ANALYSIS_BATCH_SIZE = int(os.getenv('TRAMIBOT_ANALYSIS_BATCH_SIZE', 5))
+    # Upper bound on concurrent AI calls during a single parallel scan
+    MAX_SCAN_WORKERS = int(os.getenv('TRAMIBOT_SCAN_WORKERS', 4))
+    # Default budgets per provider (requests per second, burst); see RateLimiter.from_env
+    RATE_LIMITS = {"huggingface": (1.0, 5), "openrouter": (0.33, 5)}
+    # Admission pause after a 429 without Retry-After
+    RATE_LIMIT_BACKOFF = 30
+
+    def __init__(self, cache=response_cache, fetcher=feed_fetcher, transport=shared_transport, store=update_store,
+                 async_transport=shared_async_transport):
         self.official_sources = {
-            "boe_rss": "https://www.boe.es/rss/boe.php",
+            "boe_rss": os.getenv('TRAMIBOT_BOE_RSS_URL', "https://www.boe.es/rss/boe.php"),
             "extranjeria": "https://extranjeros.inclusion.gob.es",
             "policia": "https://www.policia.es", 
             "ue_directives": "https://ec.europa.eu/immigration"
         }
         # SECURE: Get token from environment variable
         self.hf_token = os.getenv('HUGGINGFACE_TOKEN', '')
+        self.cache = cache
+        self.transport = transport
+        self.async_transport = async_transport
+        self.fetcher = fetcher
+        self.store = store
+        self.ingestion = IngestionState("boe_analyses")
+        self.last_scan_stats = {}
+        
+        self._provider_requests = {
+            "huggingface": self._request_huggingface,
+            "openrouter": self._request_openrouter
+        }
+        self._provider_streams = {
+            "openrouter": self._stream_openrouter
+        }
+        # Seconds before a slow provider gets a hedged second request (0 disables hedging)
+        self.router = ProviderRouter(hedge_delay=float(os.getenv('TRAMIBOT_HEDGE_DELAY', 0)))
+        self.router.register(
+            "huggingface",
+            lambda prompt, family: self._fetch_provider("huggingface", prompt, family),
+            available=lambda: bool(self.hf_token),
+            acall=lambda prompt, family: self._fetch_provider_async("huggingface", prompt, family)
+        )
+        self.router.register(
+            "openrouter",
+            lambda prompt, family: self._fetch_provider("openrouter", prompt, family),
+            stream=lambda prompt, family: self._stream_provider("openrouter", prompt, family),
+            acall=lambda prompt, family: self._fetch_provider_async("openrouter", prompt, family)
+        )
+        # Identical prompts already on their way to a provider are not sent twice
+        self.flights = SingleFlight()
+        self.limiters = {
+            name: RateLimiter.from_env(name, rate, burst) for name, (rate, burst) in self.RATE_LIMITS.items()
+        }
         
-    def call_huggingface_ai(self, prompt):
+    # The blocking methods run their *_async counterpart on the shared event
+    # loop (async_runtime.run_sync); asyncio code should await those directly.
+    # The coroutines keep only network I/O on the loop: cache files, the
+    # SQLite store and the log are used through asyncio.to_thread.
+    
+    def call_huggingface_ai(self, prompt, family="default"):
         """SECURE Hugging Face API call"""
-        if not self.hf_token:
-            return self.fallback_response(prompt)
-            
-        try:
-            API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-large"
-            headers = {"Authorization": f"Bearer {self.hf_token}"}
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {"max_length": 800, "temperature": 0.7}
-            }
-            
-            response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    return result[0].get('generated_text', self.fallback_response(prompt))
-            return self.fallback_response(prompt)
-            
-        except Exception as e:
-            print(f"Hugging Face API error: {e}")
-            return self.fallback_response(prompt)
+        return run_sync(self.call_huggingface_ai_async(prompt, family))
     
-    def call_openrouter_free(self, prompt):
+    async def call_huggingface_ai_async(self, prompt, family="default"):
+        return await self._call_single_async("huggingface", "call_huggingface_ai", prompt, family)
+    
+    def call_openrouter_free(self, prompt, family="default"):
         """Backup: OpenRouter free tier (no token needed)"""
+        return run_sync(self.call_openrouter_free_async(prompt, family))
+    
+    async def call_openrouter_free_async(self, prompt, family="default"):
+        return await self._call_single_async("openrouter", "call_openrouter_free", prompt, family)
+    
+    def call_ai_safely(self, prompt, family="default"):
+        """Main AI call - routes to the fastest healthy provider
+        
+        family selects the cache TTL: "guide", "update_analysis", "actions" or "default".
+        Returns busy_response() when the rate limits shed the request and
+        fallback_response() when the providers failed (see is_busy/is_fallback).
+        """
+        return run_sync(self.call_ai_safely_async(prompt, family))
+    
+    async def call_ai_safely_async(self, prompt, family="default"):
+        """Coroutine version of call_ai_safely()"""
+        started = time.perf_counter()
+        provider_name, cached = await asyncio.to_thread(self._cached_answer, prompt, family)
+        if cached is not None:
+            await self._record_call_async("call_ai_safely", family, prompt, cached, started, provider_name,
+                                          cache_hit=True)
+            return cached
+        
         try:
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": "Bearer free",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://tramibot.streamlit.app",
-                    "X-Title": "Tramibot AI"
-                },
-                json={
-                    "model": "google/palm-2-chat-bison",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 800
-                },
-                timeout=30
+            (provider_name, response), shared = await self.flights.do_async(
+                self._flight_key("router", family, prompt), self.router.acall_with_provider, prompt, family
             )
-            
-            if response.status_code == 200:
-                return response.json()['choices'][0]['message']['content']
-            return self.fallback_response(prompt)
-            
-        except:
-            return self.fallback_response(prompt)
-    
-    def call_ai_safely(self, prompt):
-        """Main AI call - tries multiple secure methods"""
-        # Try Hugging Face first (if token available)
-        if self.hf_token:
-            result = self.call_huggingface_ai(prompt)
-            if result and "unavailable" not in result.lower():
-                return result
-        
-        # Fallback to OpenRouter (free, no token)
-        return self.call_openrouter_free(prompt)
+        except RateLimited as e:
+            response = self.busy_response(prompt)
+            await self._record_call_async("call_ai_safely", family, prompt, response, started, error=e, shed=True)
+            return response
+        except ProviderError as e:
+            response = self.fallback_response(prompt)
+            await self._record_call_async("call_ai_safely", family, prompt, response, started, error=e)
+            return response
+        await self._record_call_async("call_ai_safely", family, prompt, response, started, provider_name,
+                                      coalesced=shared)
+        return response
+    
+    def stream_ai_safely(self, prompt, family="default"):
+        """Yield the answer in chunks as the provider produces them
+        
+        Cached answers and providers that can't stream arrive as one chunk.
+        When every provider fails before the first chunk, the fallback text (or
+        the busy text, when the request was shed) is yielded instead; a stream that breaks after the first chunk raises
+        ProviderError, so callers never mistake a truncated answer for a
+        complete one.
+        """
+        started = time.perf_counter()
+        provider_name, cached = self._cached_answer(prompt, family)
+        if cached is not None:
+            self._record_call("stream_ai_safely", family, prompt, cached, started, provider_name, cache_hit=True)
+            yield cached
+            return
+        
+        parts = []
+        try:
+            for chunk in self.router.stream(prompt, family):
+                if not parts:
+                    metrics.observe("tramibot_ai_first_chunk_seconds", time.perf_counter() - started,
+                                    help="Time to the first streamed chunk", family=family)
+                parts.append(chunk)
+                yield chunk
+        except ProviderError as e:
+            if not parts:
+                shed = isinstance(e, RateLimited)
+                response = self.busy_response(prompt) if shed else self.fallback_response(prompt)
+                self._record_call("stream_ai_safely", family, prompt, response, started, error=e, shed=shed)
+                yield response
+                return
+            self._record_call("stream_ai_safely", family, prompt, "".join(parts), started, error=e)
+            raise
+        self._record_call("stream_ai_safely", family, prompt, "".join(parts), started)
+    
+    async def _call_single_async(self, provider, method, prompt, family):
+        """Cached call to one named provider, with the busy or fallback text on failure"""
+        started = time.perf_counter()
+        if provider == "huggingface" and not self.hf_token:
+            response = self.fallback_response(prompt)
+            await self._record_call_async(method, family, prompt, response, started, error="no token")
+            return response
+        
+        cached = await asyncio.to_thread(self.cache.get, self._cache_key(provider, prompt), family)
+        if cached is not None:
+            await self._record_call_async(method, family, prompt, cached, started, provider, cache_hit=True)
+            return cached
+        try:
+            response, shared = await self.flights.do_async(
+                self._flight_key(provider, family, prompt), self._fetch_provider_async, provider, prompt, family
+            )
+        except RateLimited as e:
+            response = self.busy_response(prompt)
+            await self._record_call_async(method, family, prompt, response, started, provider, error=e, shed=True)
+            return response
+        except Exception as e:
+            response = self.fallback_response(prompt)
+            await self._record_call_async(method, family, prompt, response, started, provider, error=e)
+            return response
+        await self._record_call_async(method, family, prompt, response, started, provider, coalesced=shared)
+        return response
+    
+    def _record_call(self, method, family, prompt, response, started, provider=None, cache_hit=False, error=None,
+                     coalesced=False, shed=False):
+        """Latency, sizes and outcome of one public AI call, as metrics and a log line"""
+        seconds = time.perf_counter() - started
+        fallback = error is not None and response == self.fallback_response(prompt)
+        metrics.observe("tramibot_ai_call_seconds", seconds, help="AI call latency by entry point", method=method)
+        metrics.observe("tramibot_ai_prompt_chars", len(prompt), SIZE_BUCKETS, help="Prompt size", method=method)
+        metrics.observe("tramibot_ai_response_chars", len(response), SIZE_BUCKETS, help="Response size", method=method)
+        metrics.inc(
+            "tramibot_ai_calls_total", help="AI calls by entry point, answering provider and cache use",
+            method=method, provider=provider or "none", cache="hit" if cache_hit else "miss"
+        )
+        if fallback:
+            metrics.inc("tramibot_ai_fallbacks_total", help="AI calls answered with the fallback text", method=method)
+        if shed:
+            metrics.inc("tramibot_ai_shed_total", help="AI calls answered with the busy text after rate limiting",
+                        method=method)
+        if coalesced:
+            metrics.inc("tramibot_ai_coalesced_total", help="AI calls that shared an identical in-flight request",
+                        method=method)
+        log_event(
+            "ai_call", level="warning" if error else "info", method=method, family=family, provider=provider,
+            seconds=round(seconds, 4), prompt_chars=len(prompt), response_chars=len(response),
+            cache_hit=cache_hit, fallback=fallback, error=error, coalesced=coalesced, shed=shed
+        )
+    
+    async def _record_call_async(self, *args, **kwargs):
+        """_record_call() from a coroutine; the log write runs in a worker thread"""
+        await asyncio.to_thread(self._record_call, *args, **kwargs)
+    
+    def _flight_key(self, target, family, prompt):
+        """Single-flight key: same target, cache family and normalized prompt"""
+        return (target, family, self.cache.normalize_prompt(prompt))
+    
+    def _cached_answer(self, prompt, family):
+        """(provider, answer) cached by any provider, fastest healthy first, or (None, None)
+        
+        A cached answer beats a network round-trip even when its provider is
+        currently down; all providers together count as one cache lookup.
+        """
+        names = [provider.name for provider in self.router.ranked()]
+        names += [name for name in self.PROVIDER_MODELS if name not in names]
+        keys = {self._cache_key(name, prompt): name for name in names}
+        key, cached = self.cache.get_first(keys, family)
+        return keys.get(key), cached
+    
+    def _cache_key(self, provider, prompt):
+        model, params = self.PROVIDER_MODELS[provider]
+        return self.cache.make_key(provider, model, prompt, params)
+    
+    def _admit(self, provider, prompt):
+        """Wait for the provider's rate limit; raises RateLimited when the request is shed"""
+        self.limiters[provider].acquire(self._estimated_tokens(provider, prompt))
+    
+    async def _admit_async(self, provider, prompt):
+        await self.limiters[provider].acquire_async(self._estimated_tokens(provider, prompt))
+    
+    def _estimated_tokens(self, provider, prompt):
+        _, params = self.PROVIDER_MODELS[provider]
+        return estimate_tokens(prompt, params.get("max_tokens") or params.get("max_length", 0))
+    
+    def _rate_limited(self, provider, error):
+        if isinstance(error, RateLimited):
+            self.limiters[provider].backoff(error.retry_after or self.RATE_LIMIT_BACKOFF)
+    
+    def _fetch_provider(self, provider, prompt, family="default"):
+        """Uncached provider request; successful answers are stored in the cache"""
+        return run_sync(self._fetch_provider_async(provider, prompt, family))
+    
+    async def _fetch_provider_async(self, provider, prompt, family="default"):
+        await self._admit_async(provider, prompt)
+        started = time.perf_counter()
+        try:
+            text = await self._provider_requests[provider](prompt)
+        except Exception as e:
+            self._rate_limited(provider, e)
+            self._record_provider(provider, started, ok=False)
+            raise
+        self._record_provider(provider, started, ok=True)
+        await asyncio.to_thread(self.cache.set, self._cache_key(provider, prompt), text, family)
+        return text
+    
+    def _stream_provider(self, provider, prompt, family="default"):
+        """Streaming provider request; the complete answer is cached once it has arrived"""
+        self._admit(provider, prompt)
+        started = time.perf_counter()
+        parts = []
+        try:
+            for chunk in self._provider_streams[provider](prompt):
+                parts.append(chunk)
+                yield chunk
+            if not parts:
+                raise ProviderError("empty response")
+        except Exception as e:
+            self._rate_limited(provider, e)
+            self._record_provider(provider, started, ok=False)
+            raise
+        self._record_provider(provider, started, ok=True)
+        self.cache.set(self._cache_key(provider, prompt), "".join(parts), family)
+    
+    @staticmethod
+    def _record_provider(provider, started, ok):
+        metrics.observe("tramibot_ai_provider_seconds", time.perf_counter() - started,
+                        help="Upstream AI request latency", provider=provider)
+        metrics.inc("tramibot_ai_provider_requests_total", help="Upstream AI requests by outcome",
+                    provider=provider, outcome="ok" if ok else "error")
+    
+    async def _request_huggingface(self, prompt):
+        API_URL = f"{self.HF_API_URL}/{self.HF_MODEL}"
+        headers = {"Authorization": f"Bearer {self.hf_token}"}
+        
+        payload = {
+            "inputs": prompt,
+            "parameters": self.HF_PARAMS
+        }
+        
+        response = await self.async_transport.post(API_URL, headers=headers, json=payload)
+        
+        self._check_rate_limit(response)
+        if response.status_code != 200:
+            raise ProviderError(f"HTTP {response.status_code}")
+        result = response.json()
+        if not (isinstance(result, list) and len(result) > 0 and result[0].get('generated_text')):
+            raise ProviderError("empty response")
+        text = result[0]['generated_text']
+        if "unavailable" in text.lower():
+            raise ProviderError("model unavailable")
+        return text
+    
+    async def _request_openrouter(self, prompt):
+        response = await self.async_transport.post(
+            self.OPENROUTER_API_URL,
+            headers={
+                "Authorization": "Bearer free",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://tramibot.streamlit.app",
+                "X-Title": "Tramibot AI"
+            },
+            json={
+                "model": self.OPENROUTER_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                **self.OPENROUTER_PARAMS
+            }
+        )
+        
+        self._check_rate_limit(response)
+        if response.status_code != 200:
+            raise ProviderError(f"HTTP {response.status_code}")
+        try:
+            return response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise ProviderError(f"malformed response: {e}")
+    
+    def _stream_openrouter(self, prompt):
+        """OpenRouter chat completion as server-sent events, yielding content deltas"""
+        response = self.transport.post(
+            self.OPENROUTER_API_URL,
+            headers={
+                "Authorization": "Bearer free",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://tramibot.streamlit.app",
+                "X-Title": "Tramibot AI"
+            },
+            json={
+                "model": self.OPENROUTER_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True,
+                **self.OPENROUTER_PARAMS
+            },
+            stream=True
+        )
+        
+        with response:
+            self._check_rate_limit(response)
+            if response.status_code != 200:
+                raise ProviderError(f"HTTP {response.status_code}")
+            # text/event-stream without a charset would otherwise decode as Latin-1
+            response.encoding = 'utf-8'
+            # chunk_size=1 hands each event over as soon as its line is complete
+            for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+                # SSE comments (": OPENROUTER PROCESSING") and blank keep-alives carry no data
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                except (ValueError, KeyError, IndexError) as e:
+                    raise ProviderError(f"malformed stream event: {e}")
+                if delta:
+                    yield delta
+    
+    @staticmethod
+    def _check_rate_limit(response):
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get('Retry-After', ''))
+            except ValueError:
+                retry_after = None
+            raise RateLimited("HTTP 429", retry_after=retry_after)
     
     def fallback_response(self, prompt):
         """Fallback when AI services are down"""
         return "AI service is currently updating. Please check official Spanish government websites for the most current information."
     
+    def busy_response(self, prompt):
+        """Answer when the rate limits shed the request: the providers are up, retry shortly"""
+        return "AI service is busy right now. Please try again in a moment."
+    
+    def is_busy(self, text):
+        """Whether an answer is the busy text, i.e. the request was never sent"""
+        return text == self.busy_response("")
+    
+    def is_fallback(self, text):
+        """Whether an answer is the fallback or busy text rather than a provider's"""
+        return text == self.fallback_response("") or self.is_busy(text)
+    
     # Keep all your other methods (scan_official_updates, etc.)
-    def scan_official_updates(self):
-        """Scan official sources for procedure changes"""
-        updates = []
+    def scan_official_updates(self, parallel=False, max_workers=None, incremental=False, batch=False):
+        """Scan official sources for procedure changes
+        
+        Runs iter_scan() to the end and returns the updates in feed order;
+        see there for the options. Sets last_scan_stats.
+        """
+        scanned = dict(self.iter_scan(
+            parallel=parallel, max_workers=max_workers, incremental=incremental, batch=batch
+        ))
+        return [scanned[index] for index in sorted(scanned)]
+    
+    def iter_scan(self, entries=None, parallel=False, max_workers=None, incremental=True, batch=False, stats=None):
+        """Scan the BOE feed, yielding (index, update) as each update is ready
+        
+        index is the entry's position in `entries` (by default the feed's
+        immigration entries), so callers can render or store updates in feed
+        order while they stream in. Entries that failed are never yielded.
         
+        With parallel=True the entries are analyzed on a bounded worker pool.
+        With batch=True several entries share one AI call that returns
+        structured JSON (see analyze_updates_batch).
+        
+        With incremental=True only entries that are new or whose content changed
+        since the last scan are analyzed; the others reuse their stored analysis
+        and come first. Entries answered with the fallback text are not
+        recorded, so the next scan analyzes them again. Each update carries
+        'newly_processed'.
+        
+        Once the generator finishes, or is closed early, the analyses so far
+        are recorded and the scan counts are written to `stats` (if given)
+        and to last_scan_stats.
+        """
+        if entries is None:
+            entries = self.fetch_immigration_entries()
+        positions = {id(entry): index for index, entry in enumerate(entries)}
+        pending, known = self._partition(entries) if incremental else (list(entries), [])
+        
+        analyzed = []
         try:
-            feed = feedparser.parse(self.official_sources["boe_rss"])
-            for entry in feed.entries[:15]:
-                if self.is_immigration_related(entry.title):
-                    updates.append({
-                        'source': 'BOE',
-                        'date': entry.published,
-                        'title': entry.title,
-                        'content': entry.summary,
-                        'link': entry.link,
-                        'ai_analysis': self.analyze_update_safely(entry.title + " " + entry.summary)
-                    })
+            for entry in known:
+                update = self.ingestion.get(entry)
+                if update is not None:
+                    yield positions[id(entry)], dict(update, newly_processed=False)
+            for index, update in self._iter_analyses(pending, parallel, max_workers, batch):
+                analyzed.append((pending[index], update))
+                yield positions[id(pending[index])], dict(update, newly_processed=not update['is_fallback'])
+        finally:
+            completed = [(entry, update) for entry, update in analyzed if not update['is_fallback']]
+            if incremental:
+                self.ingestion.record(completed)
+            scan_stats = {
+                'entries': len(entries),
+                'newly_processed': len(completed),
+                'reused': len(known),
+                'pending': len(pending) - len(completed),
+                # Pending because the rate limits shed them, not because of an outage
+                'busy': sum(1 for _, update in analyzed if self.is_busy(update['ai_analysis']))
+            }
+            if stats is not None:
+                stats.update(scan_stats)
+            self.last_scan_stats = scan_stats
+    
+    def _partition(self, entries):
+        """(pending, known) entries; known ones whose recorded analysis is the fallback text are pending"""
+        pending, known = self.ingestion.partition(entries)
+        retry = [entry for entry in known if self.is_fallback(self.ingestion.get(entry)['ai_analysis'])]
+        if not retry:
+            return pending, known
+        pending_ids = {id(entry) for entry in pending + retry}
+        return (
+            [entry for entry in entries if id(entry) in pending_ids],
+            [entry for entry in known if id(entry) not in pending_ids]
+        )
+    
+    def _iter_analyses(self, entries, parallel=False, max_workers=None, batch=False):
+        """Yield (index, update) for entries as they are analyzed"""
+        if batch:
+            analyses = self.iter_batch_analyses(
+                [entry.title + " " + entry.summary for entry in entries], parallel, max_workers
+            )
+            for index, analysis in analyses:
+                yield index, self.build_update(entries[index], analysis)
+            return
+        
+        if parallel:
+            yield from self.iter_update_analyses(entries, max_workers)
+            return
+        
+        try:
+            for index, entry in enumerate(entries):
+                yield index, self.build_update(entry)
+        except Exception as e:
+            log_event("boe_scan_error", level="error", error=e)
+    
+    def fetch_immigration_entries(self, limit=15):
+        """Immigration-related entries among the latest BOE feed items"""
+        try:
+            feed = self.fetcher.fetch(self.official_sources["boe_rss"])
+            return [entry for entry in feed.entries[:limit] if self.is_immigration_related(entry.title)]
         except Exception as e:
-            print(f"BOE scan error: {e}")
+            log_event("boe_scan_error", level="error", error=e)
+            return []
+    
+    def build_update(self, entry, analysis=None):
+        """Turn a feed entry into an update record with its AI analysis
         
-        return updates
+        analysis is a structured result from analyze_updates_batch; without
+        it the entry is analyzed on its own.
+        """
+        if analysis is None:
+            analysis = self._analysis_from_text(self.analyze_update_safely(entry.title + " " + entry.summary))
+        return {
+            'id': IngestionState.entry_id(entry),
+            'source': 'BOE',
+            'date': entry.published,
+            'title': entry.title,
+            'content': entry.summary,
+            'link': entry.link,
+            'ai_analysis': analysis['text'],
+            'urgency': analysis['urgency'],
+            'affected_procedures': analysis['affected_procedures'],
+            'key_changes': analysis['key_changes'],
+            'is_fallback': analysis['is_fallback']
+        }
+    
+    def iter_update_analyses(self, entries, max_workers=None):
+        """Analyze entries concurrently, yielding (index, update) as each one completes
+        
+        index is the entry's position in `entries`, so callers can render or
+        store results in feed order while they stream in.
+        """
+        if not entries:
+            return
+        
+        workers = max(1, min(max_workers or self.MAX_SCAN_WORKERS, len(entries)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="boe-scan") as pool:
+            # Each task runs in the caller's context, keeping its admission priority
+            futures = {
+                pool.submit(contextvars.copy_context().run, self.build_update, entry): index
+                for index, entry in enumerate(entries)
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    log_event("boe_analysis_error", level="error", error=e)
     
     def analyze_update_safely(self, update_text):
         """Analyze updates using secure AI"""
+        return run_sync(self.analyze_update_safely_async(update_text))
+    
+    async def analyze_update_safely_async(self, update_text):
         prompt = f"""
         Analyze this Spanish legal update for immigration impact:
         {update_text}
@@ -117,37 +584,255 @@ class SecureImmigrationAI:
         - Key changes
         - Urgency level
         """
-        return self.call_ai_safely(prompt)
+        return await self.call_ai_safely_async(prompt, family="update_analysis")
     
-    def is_immigration_related(self, text):
-        keywords = ['extranjería', 'inmigración', 'residencia', 'nie', 'tie', 'visado']
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in keywords)
+    def recommended_actions(self, update):
+        """Practical steps for people affected by an update, generated once per update and stored"""
+        return run_sync(self.recommended_actions_async(update))
+    
+    async def recommended_actions_async(self, update):
+        stored = (await asyncio.to_thread(self.store.actions_for, [update])).get(self.store.update_id(update))
+        if stored is not None:
+            return stored
+        prompt = self._actions_prompt(update)
+        actions = await self.call_openrouter_free_async(prompt, family="actions")
+        if not self.is_fallback(actions):
+            await asyncio.to_thread(self.store.save_actions, update, actions)
+        return actions
+    
+    def precompute_actions(self, updates):
+        """Store recommended actions for the updates that have none; returns how many were generated"""
+        return run_sync(self.precompute_actions_async(updates))
     
-    def generate_procedure_guide(self, procedure_name, user_context=""):
-        """Generate AI-powered procedure guidance"""
+    async def precompute_actions_async(self, updates):
+        stored = await asyncio.to_thread(self.store.actions_for, updates)
+        missing = [u for u in updates if self.store.update_id(u) not in stored]
+        await asyncio.gather(*(self.recommended_actions_async(u) for u in missing))
+        return len(await asyncio.to_thread(self.store.actions_for, missing))
+    
+    @staticmethod
+    def _actions_prompt(update):
+        return f"""
+        Based on this legal update: {update['title']}
+        And this impact analysis: {update['ai_analysis']}
+        
+        Provide 3-5 specific actionable steps for people affected by this change.
+        Focus on practical, immediate actions they should take.
+        """
+    
+    def analyze_updates_batch(self, update_texts, parallel=False, max_workers=None):
+        """Analyze updates ANALYSIS_BATCH_SIZE at a time, one AI call per batch
+        
+        Each batch asks for a JSON array with affected procedures, key changes
+        and an urgency level per update. Items missing from the answer or
+        failing validation are re-analyzed on their own. Returns one dict per
+        text, in order: {'text', 'urgency', 'affected_procedures', 'key_changes',
+        'is_fallback'}.
+        """
+        results = [None] * len(update_texts)
+        for index, analysis in self.iter_batch_analyses(update_texts, parallel, max_workers):
+            results[index] = analysis
+        return results
+    
+    def iter_batch_analyses(self, update_texts, parallel=False, max_workers=None):
+        """Yield (index, analysis) as each batch of analyze_updates_batch() completes"""
+        size = self.ANALYSIS_BATCH_SIZE
+        batches = [(start, update_texts[start:start + size]) for start in range(0, len(update_texts), size)]
+        if not batches:
+            return
+        
+        context = contextvars.copy_context()
+        
+        # Each task runs in a copy of the caller's context, keeping its admission priority
+        def run_batch(texts):
+            return context.copy().run(self._analyze_batch, texts)
+        
+        def run_single(index):
+            return self._analysis_from_text(context.copy().run(self.analyze_update_safely, update_texts[index]))
+        
+        workers = max(1, min(max_workers or self.MAX_SCAN_WORKERS, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers if parallel else 1, thread_name_prefix="boe-batch") as pool:
+            # future -> (start of its batch, None) or (index of its single item, True)
+            running = {pool.submit(run_batch, texts): (start, None) for start, texts in batches}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, single = running.pop(future)
+                    if single:
+                        yield index, future.result()
+                        continue
+                    for offset, analysis in enumerate(future.result()):
+                        if analysis is None:
+                            # Per-entry fallback only for the items that failed to parse
+                            running[pool.submit(run_single, index + offset)] = (index + offset, True)
+                        else:
+                            yield index + offset, analysis
+    
+    def _analyze_batch(self, update_texts):
+        updates_block = "\n".join(
+            f"[{number}] {' '.join(text.split())}" for number, text in enumerate(update_texts, 1)
+        )
         prompt = f"""
-        As a Spanish immigration expert, provide CURRENT 2024 guidance for: {procedure_name}
+        Analyze these Spanish legal updates for immigration impact:
+        {updates_block}
         
-        User context: {user_context}
+        Answer ONLY with a JSON array containing one object per update:
+        [{{"index": <update number>, "affected_procedures": [<procedure names>],
+          "key_changes": [<short sentences>], "urgency": "low" | "medium" | "high" | "critical"}}]
+        """
+        response = self.call_ai_safely(prompt, family="update_analysis")
+        if self.is_fallback(response):
+            # Providers are down or busy: per-entry retries would only fail the same way
+            return [self._analysis_from_text(response) for _ in update_texts]
+        return self._parse_batch_analysis(response, len(update_texts))
+    
+    def _parse_batch_analysis(self, response, count):
+        """Validated analyses by position; None where the answer was missing or malformed"""
+        results = [None] * count
+        start, end = response.find('['), response.rfind(']')
+        if start == -1 or end <= start:
+            return results
+        try:
+            items = json.loads(response[start:end + 1])
+        except ValueError:
+            return results
+        if not isinstance(items, list):
+            return results
         
-        Include:
-        1. Current requirements and documents
-        2. Step-by-step process
-        3. Processing times and costs
-        4. Common issues and solutions
+        for position, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                continue
+            index = item.get('index', position)
+            procedures = item.get('affected_procedures')
+            key_changes = item.get('key_changes')
+            urgency = str(item.get('urgency', '')).strip().lower()
+            if (not isinstance(index, int) or not 1 <= index <= count
+                    or not isinstance(procedures, list) or not isinstance(key_changes, list)
+                    or urgency not in self.URGENCY_LEVELS):
+                continue
+            procedures = [str(procedure) for procedure in procedures]
+            key_changes = [str(change) for change in key_changes]
+            results[index - 1] = {
+                'text': self._format_analysis(procedures, key_changes, urgency),
+                'urgency': urgency,
+                'affected_procedures': procedures,
+                'key_changes': key_changes,
+                'is_fallback': False
+            }
+        return results
+    
+    @staticmethod
+    def _format_analysis(procedures, key_changes, urgency):
+        changes = "\n".join(f"- {change}" for change in key_changes) or "- None reported"
+        return (
+            f"**Affected procedures:** {', '.join(procedures) or 'None identified'}\n\n"
+            f"**Key changes:**\n{changes}\n\n"
+            f"**Urgency:** {urgency}"
+        )
+    
+    def _analysis_from_text(self, text):
+        """Wrap a free-text analysis in the structured shape used by batch analyses"""
+        return {
+            'text': text,
+            'urgency': self.urgency_from_text(text),
+            'affected_procedures': [],
+            'key_changes': [],
+            'is_fallback': self.is_fallback(text)
+        }
+    
+    @staticmethod
+    def urgency_from_text(text):
+        """Best-effort urgency for free-text analyses that carry no structured level"""
+        text_lower = text.lower()
+        if any(word in text_lower for word in ['urgent', 'immediate', 'critical', 'major change']):
+            return "high"
+        return "unknown"
+    
+    def get_relevant_updates(self, procedure_name, limit=10):
+        """Stored updates affecting a procedure, newest first (no feed fetch or AI call)"""
+        return self.store.updates_for_procedure(procedure_name, limit)
+    
+    def is_immigration_related(self, text):
+        return immigration_matcher.matches_any(text)
+    
+    def generate_procedure_guide(self, procedure_name, user_context="", updates=None):
+        """Generate AI-powered procedure guidance
         
-        Base on official Spanish government sources.
+        updates defaults to guide_updates(procedure_name); pass them when the
+        caller already fetched them to fingerprint the guide's sources.
         """
+        return run_sync(self.generate_procedure_guide_async(procedure_name, user_context, updates))
+    
+    async def generate_procedure_guide_async(self, procedure_name, user_context="", updates=None):
+        if updates is None:
+            updates = await asyncio.to_thread(self.guide_updates, procedure_name)
+        prompt = self._procedure_guide_prompt(procedure_name, user_context, updates)
         
-        ai_response = self.call_ai_safely(prompt)
+        ai_response = await self.call_ai_safely_async(prompt, family="guide")
         
         return {
             'procedure': procedure_name,
             'generated_at': datetime.datetime.now().isoformat(),
             'ai_guidance': ai_response,
-            'sources_checked': ['BOE', 'Ministry of Inclusion']
+            'sources_checked': self.GUIDE_SOURCES,
+            'is_fallback': self.is_fallback(ai_response),
+            'is_busy': self.is_busy(ai_response)
         }
+    
+    def stream_procedure_guide(self, procedure_name, user_context="", updates=None):
+        """Same guidance as generate_procedure_guide, yielded in chunks as it is written
+        
+        Raises ProviderError if the stream breaks partway (see stream_ai_safely).
+        """
+        if updates is None:
+            updates = self.guide_updates(procedure_name)
+        prompt = self._procedure_guide_prompt(procedure_name, user_context, updates)
+        return self.stream_ai_safely(prompt, family="guide")
+    
+    def guide_updates(self, procedure_name):
+        """Recent stored updates affecting a procedure, as considered by its guide"""
+        return self.get_relevant_updates(procedure_name, limit=self.GUIDE_UPDATE_LIMIT)
+    
+    def _procedure_guide_prompt(self, procedure_name, user_context, updates=()):
+        updates_block = "\n".join(f"        - {u['date']}: {u['title']}" for u in updates)
+        if updates_block:
+            updates_block = f"Recent official updates affecting it:\n{updates_block}\n"
+        return f"""
+        As a Spanish immigration expert, provide CURRENT 2024 guidance for: {procedure_name}
+        
+        User context: {user_context}
+        {updates_block}
+        Include:
+        1. Current requirements and documents
+        2. Step-by-step process
+        3. Processing times and costs
+        4. Common issues and solutions
+        
+        Base on official Spanish government sources.
+        """
+    
+    def cache_stats(self):
+        """Hit/miss counters of the AI response cache"""
+        return self.cache.stats()
+    
+    def provider_status(self):
+        """Latency, error rate, circuit state and rate limit queue per AI provider"""
+        status = self.router.status()
+        for name, limiter in self.limiters.items():
+            status.setdefault(name, {})["rate_limit"] = limiter.status()
+        return status
+
+# Secure instance, created on first use
+_immigration_ai = None
+_immigration_ai_lock = threading.Lock()
 
-# Secure instance
-immigration_ai = SecureImmigrationAI()
+def __getattr__(name):
+    """Build the shared immigration_ai instance on first access instead of at import"""
+    global _immigration_ai
+    if name != "immigration_ai":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _immigration_ai is None:
+        with _immigration_ai_lock:
+            if _immigration_ai is None:
+                _immigration_ai = SecureImmigrationAI()
+    return _immigration_ai
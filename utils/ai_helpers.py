@@ -1,90 +1,188 @@
 import os
-import json
 import re
+import json
+import weakref
+import asyncio
+import threading
+from importlib.util import find_spec
+
+from .provider_router import ProviderRouter, ProviderError
+from .http_transport import async_transport
+from .async_runtime import run_sync
+
+def _package_available(name):
+    """Whether a package is installed, without importing it"""
+    try:
+        return find_spec(name) is not None
+    except ImportError:
+        return False
 
-# Import OpenAI with error handling
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# The SDKs are heavy to import; they are loaded when a client is first needed
+OPENAI_AVAILABLE = _package_available("openai")
+if not OPENAI_AVAILABLE:
     print("OpenAI package not available")
 
-# Import Google Gemini with error handling  
-try:
-    import google.generativeai as genai
-    GOOGLE_AVAILABLE = True
-except ImportError:
-    GOOGLE_AVAILABLE = False
+GOOGLE_AVAILABLE = _package_available("google.generativeai")
+if not GOOGLE_AVAILABLE:
     print("Google Generative AI package not available")
 
+def compact_json(data):
+    """JSON without indentation or spaces after separators"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
 class PropertyAIAnalyzer:
-    def __init__(self):
-        self.setup_apis()
-    
-    def setup_apis(self):
-        """Initialize all available AI APIs"""
-        # OpenAI setup
-        if OPENAI_AVAILABLE:
-            self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', 'sk-dummy-key'))
-        else:
-            self.openai_client = None
+    """Property investment analysis with OpenAI or Gemini
+    
+    Each analyze method has an *_async twin; the plain one only waits for
+    it on the shared event loop, so many properties can be analyzed
+    concurrently with asyncio.gather() without a thread apiece.
+    """
+    
+    def __init__(self, comps=None):
+        self._comps = comps
+        self._openai_clients = weakref.WeakKeyDictionary()
+        self._gemini_model = None
+        self._clients_lock = threading.Lock()
+        self.router = ProviderRouter(hedge_delay=float(os.getenv('TRAMIBOT_HEDGE_DELAY', 0)))
+        self.router.register(
+            "openai", lambda prompt: run_sync(self._request_openai_async(prompt)),
+            available=lambda: OPENAI_AVAILABLE, acall=self._request_openai_async
+        )
+        self.router.register(
+            "gemini", lambda prompt: run_sync(self._request_gemini_async(prompt)),
+            available=lambda: GOOGLE_AVAILABLE and bool(os.getenv('GOOGLE_API_KEY')),
+            acall=self._request_gemini_async
+        )
+    
+    def openai_client(self):
+        """AsyncOpenAI client for the running event loop, on the shared async connection pool"""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._openai_clients.get(loop)
+            if client is None:
+                from openai import AsyncOpenAI
+                client = AsyncOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY', 'sk-dummy-key'),
+                    http_client=async_transport.client()
+                )
+                self._openai_clients[loop] = client
+        return client
+    
+    @property
+    def comps(self):
+        """CompsRanker for the analysis prompts; the shared one, loaded with NumPy on first use"""
+        if self._comps is None:
+            from .comps_ranker import comps_ranker
+            self._comps = comps_ranker
+        return self._comps
+    
+    @property
+    def gemini_model(self):
+        """Gemini model, configured on first use; None without GOOGLE_API_KEY"""
+        google_api_key = os.getenv('GOOGLE_API_KEY')
+        if self._gemini_model is None and GOOGLE_AVAILABLE and google_api_key:
+            with self._clients_lock:
+                if self._gemini_model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=google_api_key)
+                    self._gemini_model = genai.GenerativeModel('gemini-pro')
+        return self._gemini_model
+    
+    def analyze(self, property_data, comps_data):
+        """Analyze property with whichever configured backend is fastest and healthy
         
-        # Google Gemini setup
-        if GOOGLE_AVAILABLE:
-            google_api_key = os.getenv('GOOGLE_API_KEY')
-            if google_api_key:
-                genai.configure(api_key=google_api_key)
-                self.gemini_model = genai.GenerativeModel('gemini-pro')
-            else:
-                self.gemini_model = None
-        else:
-            self.gemini_model = None
+        Never raises: comps_data of an unsupported type returns "Invalid
+        comparables data: ..." and a failed AI call "AI analysis failed: ...".
+        """
+        return run_sync(self.analyze_async(property_data, comps_data))
+    
+    async def analyze_async(self, property_data, comps_data):
+        try:
+            prompt = self._create_analysis_prompt(property_data, comps_data)
+        except TypeError as e:
+            return f"Invalid comparables data: {e}"
+        
+        try:
+            return await self.router.acall(prompt)
+        except ProviderError as e:
+            return f"AI analysis failed: {str(e)}"
     
     def analyze_with_openai(self, property_data, comps_data):
-        """Analyze property using OpenAI"""
-        if not OPENAI_AVAILABLE or not self.openai_client:
+        """Analyze property using OpenAI; errors come back as text, as in analyze()"""
+        return run_sync(self.analyze_with_openai_async(property_data, comps_data))
+    
+    async def analyze_with_openai_async(self, property_data, comps_data):
+        if not OPENAI_AVAILABLE:
             return "OpenAI API not available. Please install openai package and configure API key."
         
-        prompt = self._create_analysis_prompt(property_data, comps_data)
+        try:
+            prompt = self._create_analysis_prompt(property_data, comps_data)
+        except TypeError as e:
+            return f"Invalid comparables data: {e}"
         
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a expert real estate analyst. Provide detailed, data-driven analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.3
-            )
-            return response.choices[0].message.content
+            return await self._request_openai_async(prompt)
         except Exception as e:
             return f"OpenAI analysis failed: {str(e)}"
     
     def analyze_with_gemini(self, property_data, comps_data):
-        """Analyze property using Google Gemini"""
+        """Analyze property using Google Gemini; errors come back as text, as in analyze()"""
+        return run_sync(self.analyze_with_gemini_async(property_data, comps_data))
+    
+    async def analyze_with_gemini_async(self, property_data, comps_data):
         if not GOOGLE_AVAILABLE or not self.gemini_model:
             return "Google Gemini API not available. Please install google-generativeai package and configure API key."
         
-        prompt = self._create_analysis_prompt(property_data, comps_data)
+        try:
+            prompt = self._create_analysis_prompt(property_data, comps_data)
+        except TypeError as e:
+            return f"Invalid comparables data: {e}"
         
         try:
-            response = self.gemini_model.generate_content(prompt)
-            return response.text
+            return await self._request_gemini_async(prompt)
         except Exception as e:
             return f"Gemini analysis failed: {str(e)}"
     
+    async def _request_openai_async(self, prompt):
+        response = await self.openai_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a expert real estate analyst. Provide detailed, data-driven analysis."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0.3
+        )
+        return response.choices[0].message.content
+    
+    async def _request_gemini_async(self, prompt):
+        response = await self.gemini_model.generate_content_async(prompt)
+        return response.text
+    
     def _create_analysis_prompt(self, property_data, comps_data):
-        """Create comprehensive analysis prompt"""
+        """Create comprehensive analysis prompt
+        
+        Only the comparables most similar to the property go in, as a table,
+        as many as fit the prompt token budget (see CompsRanker). comps_data
+        is a list of dicts, a dict of dicts keyed by address or a DataFrame;
+        anything else raises TypeError.
+        """
+        return self.comps.fit_prompt(
+            lambda table, used, total: self._analysis_prompt(property_data, table, used, total),
+            property_data, comps_data
+        )
+    
+    @staticmethod
+    def _analysis_prompt(property_data, comps_table, used, total):
+        selection = f" ({used} most similar of {total})" if total else ""
         return f"""
         Analyze this property for investment potential:
 
         PROPERTY DETAILS:
-        {json.dumps(property_data, indent=2)}
+        {compact_json(property_data)}
 
-        COMPARABLE PROPERTIES:
-        {json.dumps(comps_data, indent=2)}
+        COMPARABLE PROPERTIES{selection}:
+{comps_table}
 
         Please provide a comprehensive analysis with:
         1. Rental Value Estimate (monthly range)
@@ -1,36 +1,56 @@
-import requests
-import feedparser
+import os
 import json
 import datetime
-from bs4 import BeautifulSoup
-import time
+
+from .feed_fetcher import feed_fetcher
+from .ingestion_state import IngestionState
+from .keyword_matcher import immigration_matcher
+from .metrics import log_event
 
 class LegalAIUpdater:
-    def __init__(self):
+    def __init__(self, fetcher=feed_fetcher):
         self.official_sources = {
-            "boe_rss": "https://www.boe.es/rss/boe.php",
+            "boe_rss": os.getenv('TRAMIBOT_BOE_RSS_URL', "https://www.boe.es/rss/boe.php"),
             "extranjeria_news": "https://extranjeros.inclusion.gob.es/es/prensa/Noticias/index.html",
             "policia_news": "https://www.policia.es/prensa/prensa_actualidad.html"
         }
+        self.fetcher = fetcher
+        self.ingestion = IngestionState("boe_checks")
+        
+    def check_boe_updates(self, incremental=False):
+        """Check Official State Gazette for immigration-related updates
         
-    def check_boe_updates(self):
-        """Check Official State Gazette for immigration-related updates"""
+        With incremental=True each update is flagged 'newly_processed' when its
+        entry is new or changed since the previous check.
+        """
         try:
-            feed = feedparser.parse(self.official_sources["boe_rss"])
+            feed = self.fetcher.fetch(self.official_sources["boe_rss"])
             updates = []
+            entries = []
             
             for entry in feed.entries[:10]:  # Check last 10 entries
-                if any(keyword in entry.title.lower() for keyword in 
-                      ['extranjería', 'inmigración', 'residencia', 'nie', 'tie', 'visado']):
+                if immigration_matcher.matches_any(entry.title):
+                    entries.append(entry)
                     updates.append({
+                        'id': IngestionState.entry_id(entry),
                         'date': entry.published,
                         'title': entry.title,
                         'link': entry.link,
                         'summary': entry.summary[:200] + '...' if entry.summary else ''
                     })
+            
+            if incremental:
+                pending, _ = self.ingestion.partition(entries)
+                pending_ids = {IngestionState.entry_id(entry) for entry in pending}
+                for update in updates:
+                    update['newly_processed'] = update['id'] in pending_ids
+                self.ingestion.record(
+                    (entry, update) for entry, update in zip(entries, updates)
+                    if update['newly_processed']
+                )
             return updates
         except Exception as e:
-            print(f"Error checking BOE: {e}")
+            log_event("boe_check_error", level="error", error=e)
             return []
     
     def monitor_procedure_changes(self):
@@ -49,7 +69,8 @@ class LegalAIUpdater:
         for procedure in procedures_to_monitor:
             # Check for updates in official documentation
             latest_info = self.get_latest_procedure_info(procedure)
-            changes_detected.extend(latest_info)
+            if latest_info:
+                changes_detected.append(dict(latest_info, procedure=procedure))
             
         return changes_detected
     
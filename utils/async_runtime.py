@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+def get_loop():
+    """The process-wide event loop behind the synchronous AI methods, started on first use"""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=loop.run_forever, daemon=True, name="ai-event-loop")
+                _loop_thread.start()
+                _loop = loop
+    return _loop
+
+def run_sync(coro):
+    """Run a coroutine on the shared loop and block until it is done
+
+    Every synchronous caller shares the one loop, and with it the async
+    connection pool. The coroutine runs in a copy of the caller's context,
+    so context variables such as the admission priority carry over.
+    """
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the AI event loop; await the async method instead")
+
+    context = contextvars.copy_context()
+    result = concurrent.futures.Future()
+
+    def start():
+        # create_task copies the current context, which is the caller's here
+        task = context.run(loop.create_task, coro)
+
+        def done(task):
+            if task.cancelled():
+                result.cancel()
+            elif task.exception() is not None:
+                result.set_exception(task.exception())
+            else:
+                result.set_result(task.result())
+
+        task.add_done_callback(done)
+
+    loop.call_soon_threadsafe(start)
+    return result.result()
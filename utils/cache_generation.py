@@ -0,0 +1,26 @@
+import os
+import time
+
+from .paths import data_path
+from .metrics import log_event
+
+# Bumped by writers (worker, warmer, in-page scans); pages fold it into their cache keys
+GENERATION_PATH = data_path('cache_generation')
+
+def current_generation():
+    """Opaque token that changes every time invalidate_caches() runs, in any process"""
+    try:
+        with open(GENERATION_PATH, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return "0"
+
+def invalidate_caches():
+    """Make every page-level cache entry stale, e.g. after new updates were stored"""
+    tmp_path = f"{GENERATION_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{time.time_ns()}-{os.getpid()}")
+        os.replace(tmp_path, GENERATION_PATH)
+    except OSError as e:
+        log_event("cache_generation_write_error", level="error", error=e)
@@ -0,0 +1,187 @@
+import os
+from collections.abc import Mapping, Iterable
+
+import numpy as np
+
+from .rate_limiter import estimate_tokens
+
+# Relative weight of each similarity feature in the ranking
+FEATURE_WEIGHTS = {"distance": 1.0, "size": 1.0, "rooms": 0.5, "price_per_m2": 1.0}
+# Differences that count as "one unit" of dissimilarity per feature
+FEATURE_SCALES = {
+    "distance": 2.0,       # km between the two properties
+    "size": 0.25,          # log ratio of the surfaces (about 25% apart)
+    "rooms": 1.0,          # bedrooms
+    "price_per_m2": 0.2    # log ratio of the prices per m²
+}
+# Penalty, in units, for a feature the comp or the subject does not have
+MISSING_PENALTY = 1.0
+# Distance in units for a comp in another location when there are no coordinates
+OTHER_LOCATION_DISTANCE = 5.0
+# Column order of the comps table; other fields follow alphabetically
+TABLE_COLUMNS = ["address", "location", "price", "size_m2", "bedrooms", "bathrooms", "rent", "year_built", "condition"]
+EARTH_RADIUS_KM = 6371.0
+
+def _field(record, *names):
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+def _numbers(records, *names):
+    """Float column for the first present field name, NaN where it is missing or not a number"""
+    values = []
+    for record in records:
+        try:
+            values.append(float(_field(record, *names)))
+        except (TypeError, ValueError):
+            values.append(np.nan)
+    return np.array(values, dtype=float)
+
+def normalize_comps(comps):
+    """Comps as a list of dicts, from the shapes callers pass around
+
+    Accepts None, an iterable of dicts, a dict of dicts keyed by address
+    (the key fills in a missing 'address') or a pandas DataFrame. Raises
+    TypeError for anything else, naming the first offending item.
+    """
+    if comps is None:
+        return []
+    if isinstance(comps, Mapping):
+        comps = [
+            dict(comp, address=comp.get("address", key)) if isinstance(comp, Mapping) else comp
+            for key, comp in comps.items()
+        ]
+    elif hasattr(comps, "to_dict") and hasattr(comps, "columns"):
+        comps = comps.to_dict("records")
+    elif isinstance(comps, (str, bytes)) or not isinstance(comps, Iterable):
+        raise TypeError(f"comps must be a list of property dicts, not {type(comps).__name__}")
+    comps = list(comps)
+    for position, comp in enumerate(comps):
+        if not isinstance(comp, Mapping):
+            raise TypeError(f"comps must be property dicts; item {position} has type {type(comp).__name__}")
+    return comps
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+class CompsRanker:
+    """Picks the comparables most similar to a subject property for the analysis prompt
+
+    Every comp gets a distance in weighted feature units over distance,
+    size, bedrooms and price per m² (log ratios for the last two), all
+    computed column-wise with NumPy. Only the top_k nearest are kept, and
+    they are encoded as a compact pipe table; fit_prompt() then drops the
+    least similar of those until the prompt fits the token budget.
+    """
+
+    def __init__(self, top_k=None, token_budget=None, weights=None):
+        self.top_k = top_k or int(os.getenv('TRAMIBOT_COMPS_TOP_K', 8))
+        self.token_budget = token_budget or int(os.getenv('TRAMIBOT_PROMPT_TOKEN_BUDGET', 1500))
+        self.weights = dict(FEATURE_WEIGHTS, **(weights or {}))
+
+    def scores(self, subject, comps):
+        """Dissimilarity of each comp to the subject, lower is more similar"""
+        if not isinstance(subject, Mapping):
+            raise TypeError(f"property data must be a dict, not {type(subject).__name__}")
+        comps = normalize_comps(comps)
+        if not comps:
+            return np.zeros(0)
+        units = {
+            "distance": self._distance_units(subject, comps),
+            "size": self._log_ratio(subject, comps, "size_m2", "size", "area_m2") / FEATURE_SCALES["size"],
+            "rooms": np.abs(
+                _numbers(comps, "bedrooms", "rooms") - _numbers([subject], "bedrooms", "rooms")[0]
+            ) / FEATURE_SCALES["rooms"],
+            "price_per_m2": np.abs(
+                np.log(self._price_per_m2(comps)) - np.log(self._price_per_m2([subject])[0])
+            ) / FEATURE_SCALES["price_per_m2"],
+        }
+        total = np.zeros(len(comps))
+        for feature, values in units.items():
+            total += self.weights[feature] * np.nan_to_num(values, nan=MISSING_PENALTY) ** 2
+        return np.sqrt(total)
+
+    def rank(self, subject, comps, top_k=None):
+        """Indices of the top_k most similar comps, most similar first"""
+        scores = self.scores(subject, comps)
+        k = min(top_k or self.top_k, len(scores))
+        if k == 0:
+            return []
+        # Partial sort: only the k best need ordering
+        best = np.argpartition(scores, k - 1)[:k]
+        return [int(index) for index in best[np.argsort(scores[best], kind='stable')]]
+
+    def select(self, subject, comps, top_k=None):
+        comps = normalize_comps(comps)
+        return [comps[index] for index in self.rank(subject, comps, top_k)]
+
+    @staticmethod
+    def encode(comps):
+        """Comps as a pipe-separated table: one header line, one line per comp"""
+        if not comps:
+            return "(none)"
+        keys = {key for comp in comps for key in comp}
+        columns = [column for column in TABLE_COLUMNS if column in keys]
+        columns += sorted(keys - set(columns))
+        lines = [" | ".join(columns)]
+        for comp in comps:
+            lines.append(" | ".join(_cell(comp.get(column)) for column in columns))
+        return "\n".join(lines)
+
+    def fit_prompt(self, build, subject, comps, token_budget=None):
+        """The longest prompt within the token budget: build(table, used, total) with the best comps
+
+        Starts from the top_k most similar comps and drops the least similar
+        one at a time. With no comps left the prompt is returned as it is.
+        """
+        budget = token_budget or self.token_budget
+        comps = normalize_comps(comps)
+        selected = self.select(subject, comps)
+        for used in range(len(selected), 0, -1):
+            prompt = build(self.encode(selected[:used]), used, len(comps))
+            if estimate_tokens(prompt) <= budget:
+                return prompt
+        return build(self.encode([]), 0, len(comps))
+
+    def _distance_units(self, subject, comps):
+        lat = _numbers(comps, "lat", "latitude")
+        lon = _numbers(comps, "lon", "lng", "longitude")
+        subject_lat = _numbers([subject], "lat", "latitude")[0]
+        subject_lon = _numbers([subject], "lon", "lng", "longitude")[0]
+        # Haversine distance where both sides have coordinates
+        lat1, lon1, lat2, lon2 = map(np.radians, (subject_lat, subject_lon, lat, lon))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        units = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)) / FEATURE_SCALES["distance"]
+
+        # Otherwise: same location name or not. A same-location comp only counts
+        # as next door when the subject has no coordinates either
+        subject_location = str(_field(subject, "location") or "").strip().casefold()
+        if subject_location:
+            same = np.array([str(_field(comp, "location") or "").strip().casefold() == subject_location
+                             for comp in comps])
+            nearby = MISSING_PENALTY if np.isfinite(subject_lat + subject_lon) else 0.0
+            units = np.where(np.isnan(units), np.where(same, nearby, OTHER_LOCATION_DISTANCE), units)
+        return units
+
+    @staticmethod
+    def _log_ratio(subject, comps, *names):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.log(_numbers(comps, *names) / _numbers([subject], *names)[0])
+        ratio[~np.isfinite(ratio)] = np.nan
+        return np.abs(ratio)
+
+    @staticmethod
+    def _price_per_m2(records):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = _numbers(records, "price") / _numbers(records, "size_m2", "size", "area_m2")
+        values[~(values > 0)] = np.nan
+        return values
+
+# Shared instance with the env-configured top-K and budget
+comps_ranker = CompsRanker()
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .paths import data_path
+from .http_transport import transport as shared_transport
+from .metrics import metrics, log_event
+
+class FeedFetcher:
+    """Fetch RSS feeds with conditional GETs and keep the parsed snapshot on disk"""
+
+    ENTRY_FIELDS = ('id', 'title', 'summary', 'link', 'published')
+
+    def __init__(self, refresh_seconds=None, snapshot_dir=None, transport=shared_transport):
+        # Within this window every caller is served the stored snapshot
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else int(
+            os.getenv('TRAMIBOT_FEED_REFRESH_SECONDS', 300)
+        )
+        self.snapshot_dir = snapshot_dir or data_path('feeds')
+        self.transport = transport
+        self._snapshots = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def fetch(self, url):
+        """Return the parsed feed for url, downloading only when it may have changed"""
+        started = time.perf_counter()
+        result = "error"
+        try:
+            feed, result = self._fetch(url)
+            return feed
+        finally:
+            metrics.observe("tramibot_feed_fetch_seconds", time.perf_counter() - started,
+                            help="Feed fetch latency by how it was served", result=result)
+
+    def _fetch(self, url):
+        """(feed, how it was served: snapshot, not_modified, downloaded or stale_snapshot)"""
+        with self._lock_for(url):
+            snapshot = self._fresh_snapshot(url)
+            if snapshot and time.time() - snapshot['fetched_at'] < self.refresh_seconds:
+                return self._as_feed(snapshot), "snapshot"
+
+            headers = {}
+            if snapshot:
+                if snapshot.get('etag'):
+                    headers['If-None-Match'] = snapshot['etag']
+                if snapshot.get('last_modified'):
+                    headers['If-Modified-Since'] = snapshot['last_modified']
+
+            try:
+                response = self.transport.get(url, headers=headers)
+                if response.status_code == 304 and snapshot:
+                    # Unchanged upstream: no parsing, just extend the snapshot's lifetime
+                    snapshot['fetched_at'] = time.time()
+                    self._save(url, snapshot)
+                    return self._as_feed(snapshot), "not_modified"
+                response.raise_for_status()
+            except Exception as e:
+                log_event("feed_fetch_error", level="error", url=url, error=e)
+                if snapshot:
+                    return self._as_feed(snapshot), "stale_snapshot"
+                raise
+
+            import feedparser
+            parsed = feedparser.parse(response.content)
+            snapshot = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                'entries': [
+                    {field: entry.get(field, '') for field in self.ENTRY_FIELDS}
+                    for entry in parsed.entries
+                ]
+            }
+            self._save(url, snapshot)
+            return self._as_feed(snapshot), "downloaded"
+
+    def _lock_for(self, url):
+        with self._locks_guard:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def _snapshot_path(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.snapshot_dir, f"{name}.json")
+
+    def _fresh_snapshot(self, url):
+        """In-memory snapshot, re-read from disk when another process may have refreshed it"""
+        snapshot = self._snapshots.get(url)
+        if snapshot and time.time() - snapshot['fetched_at'] < self.refresh_seconds:
+            return snapshot
+        try:
+            with open(self._snapshot_path(url), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return snapshot
+        self._snapshots[url] = snapshot
+        return snapshot
+
+    def _save(self, url, snapshot):
+        self._snapshots[url] = snapshot
+        path = self._snapshot_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_event("feed_snapshot_write_error", level="error", path=path, error=e)
+
+    @staticmethod
+    def _as_feed(snapshot):
+        """Same shape as feedparser.parse() output for the fields we use"""
+        import feedparser
+        return feedparser.FeedParserDict(
+            entries=[feedparser.FeedParserDict(entry) for entry in snapshot['entries']]
+        )
+
+# Shared instance: one download serves every caller within the refresh window
+feed_fetcher = FeedFetcher()
@@ -0,0 +1,35 @@
+import itertools
+
+# Closed option sets offered by the Procedures Guide page
+NATIONALITIES = ["EU Citizen", "Non-EU Citizen", "UK Citizen", "Other"]
+LOCATIONS = ["Outside Spain", "In Spain (Tourist)", "In Spain (Legal Residence)", "In Spain (Other)"]
+DURATIONS = ["Less than 90 days", "3-6 months", "1-2 years", "Long-term/Permanent"]
+PURPOSES = ["Work", "Study", "Family Reunification", "Retirement", "Entrepreneur", "Other"]
+PROCEDURES = [
+    "First NIE Application",
+    "TIE Card Application",
+    "EU Residence Registration",
+    "Family Reunification",
+    "Student Residence Permit",
+    "Work Authorization",
+    "Long-Term EU Residence",
+    "Nationality Application",
+    "Visa Extension/Change",
+    "Empadronamiento Process"
+]
+
+def build_user_context(nationality, location, duration, purpose):
+    """User context passed to generate_procedure_guide; warmed and live guides must match exactly"""
+    return f"""
+Nationality: {nationality}
+Current Location: {location} 
+Planned Duration: {duration}
+Purpose: {purpose}
+"""
+
+def iter_matrix():
+    """Every (procedure, nationality, location, duration, purpose) the page can ask for"""
+    for nationality, location, duration, purpose, procedure in itertools.product(
+        NATIONALITIES, LOCATIONS, DURATIONS, PURPOSES, PROCEDURES
+    ):
+        yield procedure, nationality, location, duration, purpose
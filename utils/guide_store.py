@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import datetime
+
+from .paths import data_path
+from .update_store import ThreadLocalConnection
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guides (
+    key TEXT PRIMARY KEY,
+    procedure TEXT NOT NULL,
+    nationality TEXT NOT NULL,
+    location TEXT NOT NULL,
+    duration TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    guidance TEXT NOT NULL,
+    sources_version TEXT NOT NULL,
+    generated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_guides_procedure ON guides (procedure);
+
+CREATE TABLE IF NOT EXISTS guide_requests (
+    key TEXT PRIMARY KEY,
+    procedure TEXT NOT NULL,
+    nationality TEXT NOT NULL,
+    location TEXT NOT NULL,
+    duration TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    last_requested TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_guide_requests_hits ON guide_requests (hits DESC);
+"""
+
+class GuideStore:
+    """Pre-generated procedure guides for the closed Procedures Guide matrix
+
+    A guide is served while it is younger than max_age_days and the updates
+    it was written from are still the latest ones for its procedure.
+    Lives in the same database as the update store.
+    """
+
+    def __init__(self, path=None, max_age_days=None):
+        self.path = path or os.getenv('TRAMIBOT_DB_PATH', data_path('tramibot.db'))
+        self.max_age = datetime.timedelta(days=max_age_days if max_age_days is not None else int(
+            os.getenv('TRAMIBOT_GUIDE_MAX_AGE_DAYS', 7)
+        ))
+        self._connections = ThreadLocalConnection(self.path, SCHEMA)
+
+    @property
+    def db(self):
+        return self._connections.get()
+
+    @staticmethod
+    def guide_key(procedure, nationality, location, duration, purpose):
+        raw = json.dumps([procedure, nationality, location, duration, purpose], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def sources_version(updates):
+        """Fingerprint of the updates a guide was written from"""
+        ids = sorted(update['id'] for update in updates)
+        return hashlib.sha256("\n".join(ids).encode('utf-8')).hexdigest()[:16]
+
+    def get(self, combo, sources_version):
+        """Fresh stored guide for (procedure, nationality, location, duration, purpose), or None"""
+        row = self.stored(combo)
+        if row is None or not self.is_fresh(row, sources_version):
+            return None
+        return dict(row)
+
+    def stored(self, combo):
+        """Stored guide row regardless of freshness"""
+        return self.db.execute("SELECT * FROM guides WHERE key = ?", (self.guide_key(*combo),)).fetchone()
+
+    def is_fresh(self, row, sources_version):
+        age = datetime.datetime.now() - datetime.datetime.fromisoformat(row['generated_at'])
+        return age < self.max_age and row['sources_version'] == sources_version
+
+    def save(self, combo, guidance, sources_version):
+        with self.db as conn:
+            conn.execute(
+                """INSERT INTO guides (key, procedure, nationality, location, duration, purpose,
+                                       guidance, sources_version, generated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       guidance = excluded.guidance, sources_version = excluded.sources_version,
+                       generated_at = excluded.generated_at""",
+                (
+                    self.guide_key(*combo), *combo, guidance, sources_version,
+                    datetime.datetime.now().isoformat()
+                )
+            )
+
+    def record_request(self, combo):
+        """Count demand for a combination so warming can prioritise it"""
+        with self.db as conn:
+            conn.execute(
+                """INSERT INTO guide_requests (key, procedure, nationality, location, duration, purpose, hits, last_requested)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                   ON CONFLICT (key) DO UPDATE SET
+                       hits = hits + 1, last_requested = excluded.last_requested""",
+                (self.guide_key(*combo), *combo, datetime.datetime.now().isoformat())
+            )
+
+    def top_requested(self, limit):
+        rows = self.db.execute(
+            "SELECT procedure, nationality, location, duration, purpose FROM guide_requests ORDER BY hits DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+# Shared instance for the warmer and the Procedures Guide page
+guide_store = GuideStore()
@@ -0,0 +1,75 @@
+"""Pre-generates Procedures Guide answers so the page serves them from the guide store
+
+    python -m utils.guide_warmer --top-k 50   # the 50 most requested combinations
+    python -m utils.guide_warmer --all        # the whole option matrix (3,840 guides)
+
+Guides that are still fresh and whose source updates are unchanged are skipped,
+so re-running after a scan only regenerates the procedures that were affected.
+"""
+import os
+import argparse
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import ai_core
+from .guide_store import guide_store
+from .guide_matrix import iter_matrix, build_user_context, PROCEDURES
+from .cache_generation import invalidate_caches
+from .rate_limiter import priority, BACKGROUND
+from .metrics import log_event
+
+def warm_guides(combos, ai=None, store=guide_store, max_workers=None):
+    """Generate and store guides for the stale combinations; returns counts by outcome"""
+    ai = ai or ai_core.immigration_ai
+    # One updates lookup per procedure rather than per combination
+    updates = {procedure: ai.guide_updates(procedure) for procedure in {combo[0] for combo in combos}}
+    versions = {procedure: store.sources_version(items) for procedure, items in updates.items()}
+
+    stats = {'fresh': 0, 'generated': 0, 'failed': 0}
+    stale = []
+    for combo in combos:
+        row = store.stored(combo)
+        if row is not None and store.is_fresh(row, versions[combo[0]]):
+            stats['fresh'] += 1
+        else:
+            stale.append(combo)
+
+    def generate(combo):
+        procedure = combo[0]
+        guide = ai.generate_procedure_guide(procedure, build_user_context(*combo[1:]), updates=updates[procedure])
+        if guide['is_fallback']:
+            return False
+        store.save(combo, guide['ai_guidance'], versions[procedure])
+        return True
+
+    # Warming yields to page requests at the AI providers
+    with priority(BACKGROUND):
+        context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max_workers or ai.MAX_SCAN_WORKERS) as executor:
+        futures = {executor.submit(context.copy().run, generate, combo): combo for combo in stale}
+        for future in as_completed(futures):
+            try:
+                stats['generated' if future.result() else 'failed'] += 1
+            except Exception as e:
+                log_event("guide_warm_error", level="error", combo=list(futures[future]), error=e)
+                stats['failed'] += 1
+    if stats['generated']:
+        invalidate_caches()
+    return stats
+
+def combos_to_warm(top_k=None, full=False, store=guide_store):
+    """The whole matrix, or the top_k most requested combinations"""
+    if full:
+        return list(iter_matrix())
+    return [combo for combo in store.top_requested(top_k) if combo[0] in PROCEDURES]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tramibot procedure guide warmer")
+    parser.add_argument("--top-k", type=int, default=int(os.getenv('TRAMIBOT_GUIDE_TOP_K', 50)),
+                        help="warm the K most requested combinations (default: 50)")
+    parser.add_argument("--all", action="store_true", help="warm every combination of the option matrix")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent AI calls")
+    args = parser.parse_args()
+
+    combos = combos_to_warm(args.top_k, args.all)
+    print(f"Warming {len(combos)} guides: {warm_guides(combos, max_workers=args.workers)}")
@@ -0,0 +1,153 @@
+import os
+import time
+import weakref
+import threading
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+
+class HttpTransport:
+    """Keep-alive HTTP client shared by feed fetching and streamed AI answers
+
+    Every thread gets its own requests.Session (so cookies and headers never
+    leak between concurrent calls), but all sessions mount the same adapter,
+    so connections are pooled per host and reused across threads.
+    Non-streamed AI calls go through AsyncHttpTransport instead.
+    requests is only imported when the first request is made.
+    """
+
+    def __init__(self, pool_hosts=None, pool_size=None, connect_timeout=None, read_timeout=None, retries=0):
+        self.pool_hosts = pool_hosts or int(os.getenv('TRAMIBOT_HTTP_POOL_HOSTS', 10))
+        self.pool_size = pool_size or int(os.getenv('TRAMIBOT_HTTP_POOL_SIZE', 16))
+        self.timeout = (
+            connect_timeout or float(os.getenv('TRAMIBOT_HTTP_CONNECT_TIMEOUT', 5)),
+            read_timeout or float(os.getenv('TRAMIBOT_HTTP_READ_TIMEOUT', 30))
+        )
+        self.retries = retries
+        self._adapter = None
+        self._adapter_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def adapter(self):
+        if self._adapter is None:
+            with self._adapter_lock:
+                if self._adapter is None:
+                    from requests.adapters import HTTPAdapter
+                    # pool_connections: number of hosts kept; pool_maxsize: open connections per host
+                    self._adapter = HTTPAdapter(
+                        pool_connections=self.pool_hosts,
+                        pool_maxsize=self.pool_size,
+                        max_retries=self.retries
+                    )
+        return self._adapter
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            session.headers['User-Agent'] = 'Tramibot/1.0 (+https://tramibot.streamlit.app)'
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).hostname or ""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception as e:
+            import requests
+            outcome = "timeout" if isinstance(e, requests.Timeout) else "error"
+            metrics.inc("tramibot_http_failures_total", help="HTTP requests without a response", host=host, reason=outcome)
+            raise
+        finally:
+            # Time to the response headers; streamed bodies are read later
+            metrics.observe("tramibot_http_request_seconds", time.perf_counter() - started,
+                            help="Outbound HTTP latency", host=host)
+        metrics.inc("tramibot_http_responses_total", help="HTTP responses by status class",
+                    host=host, status=f"{response.status_code // 100}xx")
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """Close every pooled connection"""
+        if self._adapter is not None:
+            self._adapter.close()
+
+class AsyncHttpTransport:
+    """Asyncio counterpart of HttpTransport for the async AI clients, built on httpx
+
+    One httpx.AsyncClient, and so one connection pool, per event loop: an
+    asyncio client cannot be shared between loops. In practice that is the
+    shared loop behind the synchronous wrappers (see async_runtime) plus any
+    loop of an application using the async API directly.
+    httpx is only imported when the first client is created.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.pool_size = pool_size or int(os.getenv('TRAMIBOT_ASYNC_POOL_SIZE', 100))
+        self.connect_timeout = connect_timeout or float(os.getenv('TRAMIBOT_HTTP_CONNECT_TIMEOUT', 5))
+        self.read_timeout = read_timeout or float(os.getenv('TRAMIBOT_HTTP_READ_TIMEOUT', 30))
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def client(self):
+        """The running loop's client; call from a coroutine"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                import httpx
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    headers={'User-Agent': 'Tramibot/1.0 (+https://tramibot.streamlit.app)'}
+                )
+                self._clients[loop] = client
+        return client
+
+    async def request(self, method, url, **kwargs):
+        host = urlsplit(url).hostname or ""
+        started = time.perf_counter()
+        try:
+            response = await self.client().request(method, url, **kwargs)
+        except Exception as e:
+            import httpx
+            outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+            metrics.inc("tramibot_http_failures_total", help="HTTP requests without a response", host=host, reason=outcome)
+            raise
+        finally:
+            metrics.observe("tramibot_http_request_seconds", time.perf_counter() - started,
+                            help="Outbound HTTP latency", host=host)
+        metrics.inc("tramibot_http_responses_total", help="HTTP responses by status class",
+                    host=host, status=f"{response.status_code // 100}xx")
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def aclose(self):
+        """Close the running loop's client"""
+        import asyncio
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+# Shared instances: one set of connection pools per process
+transport = HttpTransport()
+async_transport = AsyncHttpTransport()
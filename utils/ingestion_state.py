@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .paths import data_path
+from .metrics import log_event
+
+class IngestionState:
+    """Persisted set of feed entries already processed, keyed by entry GUID
+
+    The app and the background worker share the file: it is re-read whenever
+    another process has replaced it, so a write merges into the latest state
+    instead of overwriting the other process's records.
+    """
+
+    def __init__(self, name, state_dir=None, max_records=2000):
+        self.path = os.path.join(state_dir or data_path('ingestion'), f"{name}.json")
+        self.max_records = max_records
+        self._records = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def entry_id(entry):
+        """Stable identifier: the feed GUID, or the link when the feed has none"""
+        return entry.get('id') or entry.get('link') or entry.get('title', '')
+
+    @staticmethod
+    def content_hash(entry):
+        text = f"{entry.get('title', '')}\n{entry.get('summary', '')}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def partition(self, entries):
+        """Split entries into (pending, known): pending are new or changed since last ingest"""
+        pending, known = [], []
+        with self._lock:
+            records = self._load()
+            for entry in entries:
+                record = records.get(self.entry_id(entry))
+                if record and record['hash'] == self.content_hash(entry):
+                    known.append(entry)
+                else:
+                    pending.append(entry)
+        return pending, known
+
+    def get(self, entry):
+        """Stored result for an entry, or None"""
+        with self._lock:
+            record = self._load().get(self.entry_id(entry))
+        return record['result'] if record else None
+
+    def record(self, entries_and_results):
+        """Remember processed entries with their results and persist the state"""
+        with self._lock:
+            records = self._load()
+            now = time.time()
+            for entry, result in entries_and_results:
+                records[self.entry_id(entry)] = {
+                    'hash': self.content_hash(entry),
+                    'seen_at': now,
+                    'result': result
+                }
+            if len(records) > self.max_records:
+                oldest = sorted(records, key=lambda key: records[key]['seen_at'])
+                for key in oldest[:len(records) - self.max_records]:
+                    del records[key]
+            self._save(records)
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._records is None or mtime != self._mtime:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._records = json.load(f)
+            except (OSError, ValueError):
+                self._records = {}
+            self._mtime = mtime
+        return self._records
+
+    def _save(self, records):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False)
+            # Taken before the rename, so a later write by another process still shows as a change
+            mtime = os.stat(tmp_path).st_mtime_ns
+            os.replace(tmp_path, self.path)
+            self._mtime = mtime
+        except OSError as e:
+            log_event("ingestion_state_write_error", level="error", path=self.path, error=e)
@@ -0,0 +1,70 @@
+import re
+import unicodedata
+
+# Terms that make a BOE item immigration-related
+IMMIGRATION_KEYWORDS = {
+    "extranjería": 1,
+    "inmigración": 1,
+    "residencia": 1,
+    "nie": 1,
+    "tie": 1,
+    "visado": 1,
+    # Whole-word matching needs the plurals the old substring test caught
+    "residencias": 1,
+    "visados": 1
+}
+
+def normalize(text):
+    """Casefold and strip accents so 'Extranjeria' matches 'extranjería'"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+class KeywordMatcher:
+    """Matches weighted keyword sets in a single regex pass over accent-folded text
+
+    keyword_sets maps a set name (e.g. a procedure) to {term: weight} or a
+    list of terms (weight 1). Terms only match as whole words, so 'nie'
+    does not fire inside 'niega'.
+    """
+
+    def __init__(self, keyword_sets):
+        self.terms = {}
+        for set_name, keywords in keyword_sets.items():
+            if not isinstance(keywords, dict):
+                keywords = {term: 1 for term in keywords}
+            for term, weight in keywords.items():
+                self.terms.setdefault(normalize(term), []).append((set_name, weight))
+
+        # Longest first so multi-word terms win over the words inside them
+        alternation = "|".join(re.escape(term) for term in sorted(self.terms, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)") if self.terms else None
+
+    def find(self, text):
+        """Matched terms per keyword set: {set_name: [term, ...]}"""
+        found = {}
+        if not text or self._pattern is None:
+            return found
+        for match in self._pattern.finditer(normalize(text)):
+            term = match.group(0)
+            for set_name, _ in self.terms[term]:
+                terms = found.setdefault(set_name, [])
+                if term not in terms:
+                    terms.append(term)
+        return found
+
+    def scores(self, text):
+        """Sum of the weights of distinct matched terms per keyword set"""
+        matched = {term for terms in self.find(text).values() for term in terms}
+        totals = {}
+        for term in matched:
+            for set_name, weight in self.terms[term]:
+                totals[set_name] = totals.get(set_name, 0) + weight
+        return totals
+
+    def matches_any(self, text):
+        return bool(text) and self._pattern is not None and self._pattern.search(normalize(text)) is not None
+
+# Shared matcher for the immigration relevance filter
+immigration_matcher = KeywordMatcher({"immigration": IMMIGRATION_KEYWORDS})
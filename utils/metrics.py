@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .paths import data_path
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 5000, 10000, 50000)
+
+class Metrics:
+    """In-process counters and histograms, exported in Prometheus text format
+
+    Metrics are created on first use; label values become part of the series
+    key, so keep them to small closed sets (method, provider, page, outcome).
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def inc(self, name, amount=1, help=None, **labels):
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, help=None, **labels):
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(series['buckets']):
+                if value <= bound:
+                    series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, help=None, **labels):
+        """Observe the duration of the with-block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help=help, **labels)
+
+    def render(self):
+        """All series in Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(series, counts=list(series['counts'])) for key, series in self._histograms.items()}
+            meta = dict(self._help)
+
+        lines = []
+        for name in sorted(meta):
+            kind, help = meta[name]
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+                continue
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(series['buckets'], series['counts']):
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {series['sum']}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path=None):
+        """Write the metrics for a node_exporter textfile collector (atomic replace)"""
+        path = path or os.getenv('TRAMIBOT_METRICS_FILE') or data_path('metrics', 'tramibot.prom')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_event("metrics_write_error", level="error", path=path, error=e)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose /metrics over HTTP from a daemon thread; later calls are no-ops"""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            log_event("metrics_serve_error", level="error", port=port, error=e)
+            return None
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-http").start()
+        return self._server
+
+    @staticmethod
+    def _label_key(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in labels:
+            value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+def describe_error(error):
+    """Text for an exception, falling back to its repr when str() is empty (httpx timeouts)"""
+    return str(error) or repr(error)
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line: time, level, event, pid and the event's fields"""
+
+    def format(self, record):
+        return json.dumps({
+            "ts": record.created,
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "pid": record.process,
+            **getattr(record, "fields", {})
+        }, ensure_ascii=False, default=str)
+
+_event_logger = logging.getLogger("tramibot.events")
+_event_logger.propagate = False
+_event_logger.setLevel(logging.INFO)
+_log_lock = threading.Lock()
+
+def _event_handler():
+    """Rotating JSON-lines file handler, attached on the first event"""
+    if not _event_logger.handlers:
+        with _log_lock:
+            if not _event_logger.handlers:
+                path = os.getenv('TRAMIBOT_LOG_PATH') or data_path('logs', 'tramibot.jsonl')
+                handler = RotatingFileHandler(
+                    path, encoding='utf-8', delay=True,
+                    maxBytes=int(os.getenv('TRAMIBOT_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                    backupCount=int(os.getenv('TRAMIBOT_LOG_BACKUPS', 5))
+                )
+                handler.setFormatter(JsonLogFormatter())
+                _event_logger.addHandler(handler)
+    return _event_logger
+
+def log_event(event, level="info", **fields):
+    """Write one JSON line to the structured log
+
+    Exception values are logged as their text plus a "<field>_type" with the
+    exception class, so errors with an empty message stay identifiable.
+    """
+    for key, value in list(fields.items()):
+        if isinstance(value, BaseException):
+            fields[key] = describe_error(value)
+            fields[f"{key}_type"] = type(value).__name__
+    _event_handler().log(logging.getLevelName(level.upper()), event, extra={"fields": fields})
+
+# Shared registry; the pages and the worker export it via serve() or write_textfile()
+metrics = Metrics()
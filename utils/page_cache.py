@@ -0,0 +1,68 @@
+"""Streamlit caching shared by every session of a server process
+
+The AI client is the process-wide ai_core.immigration_ai; scans, update
+lookups and stored guides are cache data keyed by their inputs plus the
+cache generation, so a new scan from the worker (which calls
+invalidate_caches) is picked up on the next rerun instead of after the TTL.
+"""
+import os
+import time
+
+import streamlit as st
+
+from .metrics import metrics
+from . import ai_core
+from .ai_core import SecureImmigrationAI
+from .update_store import update_store
+from .guide_store import guide_store
+from .cache_generation import current_generation, invalidate_caches
+
+def get_immigration_ai():
+    """The process-wide immigration_ai, shared by every session and the worker helpers
+    
+    One instance means one router, one set of circuit breakers and rate
+    limits, and one in-flight map per process.
+    """
+    return ai_core.immigration_ai
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_export():
+    """Serve /metrics from this server process when TRAMIBOT_METRICS_PORT is set"""
+    port = os.getenv('TRAMIBOT_METRICS_PORT')
+    return metrics.serve(int(port)) if port else None
+
+def record_render(page, started):
+    """Observe a page's script run time, started being a time.perf_counter() value"""
+    metrics.observe("tramibot_page_render_seconds", time.perf_counter() - started,
+                    help="Streamlit page script run time", page=page)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _latest_scan(source, generation):
+    return update_store.latest_scan(source)
+
+def latest_scan(source="BOE"):
+    return _latest_scan(source, current_generation())
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _relevant_updates(procedure_name, limit, generation):
+    return get_immigration_ai().get_relevant_updates(procedure_name, limit)
+
+def relevant_updates(procedure_name, limit=10):
+    return _relevant_updates(procedure_name, limit, current_generation())
+
+def guide_updates(procedure_name):
+    """Updates a guide for procedure_name is written from (see SecureImmigrationAI.guide_updates)"""
+    return relevant_updates(procedure_name, SecureImmigrationAI.GUIDE_UPDATE_LIMIT)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _stored_guide(combo, sources_version, generation):
+    return guide_store.get(combo, sources_version)
+
+def stored_guide(combo, sources_version):
+    """Fresh pre-generated guide for combo, or None"""
+    return _stored_guide(combo, sources_version, current_generation())
+
+def save_guide(combo, guidance, sources_version):
+    """Store a live-generated guide and drop the cached miss for it"""
+    guide_store.save(combo, guidance, sources_version)
+    _stored_guide.clear()
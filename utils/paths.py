@@ -0,0 +1,13 @@
+import os
+
+# Runtime data (caches, snapshots, databases) lives outside the source files
+DATA_DIR = os.getenv(
+    'TRAMIBOT_DATA_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+)
+
+def data_path(*parts):
+    """Return a path inside the data directory, creating its parent folder"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,68 @@
+from .keyword_matcher import KeywordMatcher
+
+# Canonical procedure -> weighted terms that identify it in BOE titles and summaries.
+# Form codes and full names are unambiguous (2); generic words only hint (1).
+PROCEDURE_ALIASES = {
+    "NIE": {"nie": 2, "número de identidad de extranjero": 2, "ex-15": 2, "ex15": 2},
+    "TIE": {"tie": 2, "tarjeta de identidad de extranjero": 2, "ex-17": 2, "ex17": 2, "toma de huellas": 1},
+    "EU Registration": {"registro central de extranjeros": 2, "certificado de registro": 2,
+                        "ciudadanos de la unión": 1, "ciudadano de la unión": 1, "ex-18": 2, "ex18": 2},
+    "Family Reunification": {"reagrupación familiar": 2, "familiar de ciudadano": 2,
+                             "ex-02": 2, "ex02": 2, "ex-19": 2, "ex19": 2},
+    "Student Residence": {"estancia por estudios": 2, "estudiantes": 1, "estudios": 1, "ex-00": 2, "ex00": 2},
+    "Work Authorization": {"autorización de trabajo": 2, "autorización de residencia y trabajo": 2,
+                           "cuenta ajena": 1, "cuenta propia": 1, "ex-03": 2, "ex03": 2, "ex-07": 2, "ex07": 2},
+    "Long-Term Residence": {"larga duración": 2, "residencia de larga": 2, "ex-11": 2, "ex11": 2},
+    "Nationality": {"nacionalidad": 2, "ccse": 2, "dele": 1},
+    "Visa": {"visado": 2, "visados": 2, "estancia de corta duración": 1},
+    "Empadronamiento": {"empadronamiento": 2, "padrón municipal": 2}
+}
+
+# Procedure names shown in the pages and the updater -> canonical procedure
+PROCEDURE_LABELS = {
+    "NIE Applications": "NIE",
+    "NIE Application": "NIE",
+    "First NIE Application": "NIE",
+    "TIE Card Processing": "TIE",
+    "TIE Card": "TIE",
+    "TIE Card Application": "TIE",
+    "EU Registration": "EU Registration",
+    "EU Residence Registration": "EU Registration",
+    "Family Reunification": "Family Reunification",
+    "Student Visas": "Student Residence",
+    "Student Residence": "Student Residence",
+    "Student Residence Permit": "Student Residence",
+    "Work Permits": "Work Authorization",
+    "Work Permit": "Work Authorization",
+    "Work Authorization": "Work Authorization",
+    "Long-Term Residence": "Long-Term Residence",
+    "Long-Term EU Residence": "Long-Term Residence",
+    "Nationality Applications": "Nationality",
+    "Nationality Application": "Nationality",
+    "Visa Extension/Change": "Visa",
+    "Empadronamiento Process": "Empadronamiento"
+}
+
+class ProcedureIndex:
+    """Classifies updates into the procedures they affect
+
+    The store keeps the resulting (update, procedure) postings in SQL, so
+    lookups are a single indexed query and every process sees the same index.
+    """
+
+    # An unambiguous term, or two generic hints, marks an update as affecting a procedure
+    MIN_SCORE = 2
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or PROCEDURE_ALIASES
+        self.matcher = KeywordMatcher(self.aliases)
+
+    @staticmethod
+    def canonical(procedure_name):
+        """Map a display name ("TIE Card Processing") to its canonical procedure"""
+        return PROCEDURE_LABELS.get(procedure_name, procedure_name)
+
+    def procedures_for(self, update):
+        """Canonical procedures an update affects, based on its title and text"""
+        text = " ".join(str(update.get(field) or '') for field in ('title', 'content', 'summary'))
+        return [procedure for procedure, score in self.matcher.scores(text).items() if score >= self.MIN_SCORE]
@@ -0,0 +1,384 @@
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .metrics import describe_error
+
+class ProviderError(Exception):
+    """A provider call that did not produce a usable answer"""
+
+class RateLimited(ProviderError):
+    """The request was not sent, or was refused with HTTP 429, because of rate limits
+
+    Says nothing about the provider's health, so it never trips the breaker.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Stops calling a provider after repeated failures, then probes it again after a cooldown"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return not self._probe_in_flight
+
+    def try_acquire(self):
+        """Claim permission for one call; in half-open state only a single probe runs"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Give back a claimed call without recording an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class ProviderStats:
+    """Rolling latency and error rate over the last `window` calls
+
+    Calls older than max_age seconds are ignored, so a provider that was
+    demoted for errors gets tried again once its bad record goes stale.
+    """
+
+    def __init__(self, window=20, max_age=300):
+        self.calls = deque(maxlen=window)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.calls.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            return [(latency, ok) for at, latency, ok in self.calls if at >= cutoff]
+
+    def latency(self):
+        """Median latency of recent successful calls, None before the first one"""
+        latencies = sorted(latency for latency, ok in self._recent() if ok)
+        if not latencies:
+            return None
+        return latencies[len(latencies) // 2]
+
+    def error_rate(self):
+        calls = self._recent()
+        if not calls:
+            return 0.0
+        return sum(1 for _, ok in calls if not ok) / len(calls)
+
+class Provider:
+    def __init__(self, name, call, priority, available=None, failure_threshold=3, reset_timeout=60, window=20, stream=None,
+                 acall=None):
+        self.name = name
+        self.call = call
+        self.stream = stream
+        self.acall = acall
+        self.priority = priority
+        self.available = available or (lambda: True)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = ProviderStats(window)
+
+def _all_failed(errors):
+    """Error for a call no provider answered, from (provider name, exception) pairs
+
+    RateLimited when every provider only refused for rate limits, so callers
+    can tell "busy, retry shortly" from an outage.
+    """
+    if not errors:
+        return ProviderError("No healthy AI provider available")
+    message = "; ".join(f"{name}: {describe_error(error)}" for name, error in errors)
+    if all(isinstance(error, RateLimited) for _, error in errors):
+        retry_after = [error.retry_after for _, error in errors if error.retry_after is not None]
+        return RateLimited(message, retry_after=min(retry_after) if retry_after else None)
+    return ProviderError(message)
+
+def _discard_result(task):
+    # Retrieve the outcome of a losing hedged call so asyncio does not log it
+    if not task.cancelled():
+        task.exception()
+
+class ProviderRouter:
+    """Routes each call to the fastest healthy provider, failing over to the others
+
+    Providers are plain callables that return text and raise on failure.
+    With hedge_delay set, a second provider is started when the first has not
+    answered after that many seconds, and the first answer wins.
+    """
+
+    # Shared by every router so hedged calls don't spawn unbounded threads
+    _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai-router")
+
+    def __init__(self, hedge_delay=None, failure_threshold=3, reset_timeout=60, window=20):
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.window = window
+        self.providers = []
+
+    def register(self, name, call, available=None, stream=None, acall=None):
+        """Add a provider; registration order breaks ties between equally fast providers
+
+        stream is an optional generator function yielding text chunks; providers
+        without one are served by stream() as a single chunk from call.
+        acall is an optional coroutine function used by acall_with_provider();
+        without one, call runs in a worker thread.
+        """
+        self.providers.append(Provider(
+            name, call, len(self.providers), available,
+            self.failure_threshold, self.reset_timeout, self.window, stream, acall
+        ))
+
+    def ranked(self):
+        """Usable providers, fastest healthy first; untried providers keep their priority"""
+        candidates = [p for p in self.providers if p.available() and p.breaker.is_available()]
+
+        def sort_key(provider):
+            latency = provider.stats.latency()
+            degraded = provider.stats.error_rate() >= 0.5
+            return (degraded, latency if latency is not None else 0.0, provider.priority)
+
+        return sorted(candidates, key=sort_key)
+
+    def call(self, *args, **kwargs):
+        """Call providers until one answers; raises ProviderError when all fail
+
+        The error is RateLimited when every provider refused for rate limits.
+        """
+        return self.call_with_provider(*args, **kwargs)[1]
+
+    def call_with_provider(self, *args, **kwargs):
+        """Like call(), but returns (provider name, answer)"""
+        candidates = self.ranked()
+        if not candidates:
+            raise ProviderError("No healthy AI provider available")
+
+        if not self.hedge_delay:
+            errors = []
+            for provider in candidates:
+                try:
+                    return provider.name, self._invoke(provider, args, kwargs)
+                except Exception as e:
+                    errors.append((provider.name, e))
+            raise _all_failed(errors)
+
+        return self._call_hedged(candidates, args, kwargs)
+
+    async def acall(self, *args, **kwargs):
+        """Coroutine version of call()"""
+        return (await self.acall_with_provider(*args, **kwargs))[1]
+
+    async def acall_with_provider(self, *args, **kwargs):
+        """Coroutine version of call_with_provider(), with the same failover and hedging"""
+        candidates = self.ranked()
+        if not candidates:
+            raise ProviderError("No healthy AI provider available")
+
+        if not self.hedge_delay:
+            errors = []
+            for provider in candidates:
+                try:
+                    return provider.name, await self._ainvoke(provider, args, kwargs)
+                except Exception as e:
+                    errors.append((provider.name, e))
+            raise _all_failed(errors)
+
+        return await self._acall_hedged(candidates, args, kwargs)
+
+    def stream(self, *args, **kwargs):
+        """Like call(), but yields text chunks as the chosen provider produces them
+
+        Failover only happens before the first chunk; a stream that breaks
+        halfway raises ProviderError so callers never see two answers spliced.
+        """
+        errors = []
+        for provider in self.ranked():
+            if not provider.breaker.try_acquire():
+                continue
+            start = time.monotonic()
+            started = False
+            try:
+                if provider.stream is None:
+                    chunks = [provider.call(*args, **kwargs)]
+                else:
+                    chunks = provider.stream(*args, **kwargs)
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # Consumer stopped reading; free the breaker without judging the provider
+                provider.breaker.release()
+                raise
+            except RateLimited as e:
+                provider.breaker.release()
+                if started:
+                    raise
+                errors.append((provider.name, e))
+                continue
+            except Exception as e:
+                provider.stats.record(time.monotonic() - start, ok=False)
+                provider.breaker.record_failure()
+                if started:
+                    raise ProviderError(f"{provider.name}: stream interrupted: {describe_error(e)}")
+                errors.append((provider.name, e))
+                continue
+            provider.stats.record(time.monotonic() - start, ok=True)
+            provider.breaker.record_success()
+            return
+        raise _all_failed(errors)
+
+    def _call_hedged(self, candidates, args, kwargs):
+        queue = list(candidates)
+        running = {}
+        errors = []
+
+        def launch():
+            provider = queue.pop(0)
+            # In the caller's context, so the call keeps its admission priority
+            running[self._executor.submit(contextvars.copy_context().run, self._invoke, provider, args, kwargs)] = provider
+
+        launch()
+        while running:
+            # Only wait for the hedge delay while there is still someone to hedge with
+            done, _ = wait(running, timeout=self.hedge_delay if queue else None, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                provider = running.pop(future)
+                try:
+                    # Slower calls keep running; their outcome still feeds the stats
+                    return provider.name, future.result()
+                except Exception as e:
+                    errors.append((provider.name, e))
+            if queue:
+                launch()
+        raise _all_failed(errors)
+
+    async def _acall_hedged(self, candidates, args, kwargs):
+        queue = list(candidates)
+        running = {}
+        errors = []
+
+        def launch():
+            provider = queue.pop(0)
+            running[asyncio.ensure_future(self._ainvoke(provider, args, kwargs))] = provider
+
+        launch()
+        while running:
+            done, _ = await asyncio.wait(
+                running, timeout=self.hedge_delay if queue else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                launch()
+                continue
+            for task in done:
+                provider = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    errors.append((provider.name, e))
+                    continue
+                # Slower calls keep running; their outcome still feeds the stats
+                for other in running:
+                    other.add_done_callback(_discard_result)
+                return provider.name, result
+            if queue:
+                launch()
+        raise _all_failed(errors)
+
+    async def _ainvoke(self, provider, args, kwargs):
+        if not provider.breaker.try_acquire():
+            raise ProviderError("circuit open")
+        start = time.monotonic()
+        try:
+            if provider.acall is not None:
+                result = await provider.acall(*args, **kwargs)
+            else:
+                result = await asyncio.to_thread(provider.call, *args, **kwargs)
+        except RateLimited:
+            provider.breaker.release()
+            raise
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.stats.record(time.monotonic() - start, ok=False)
+            provider.breaker.record_failure()
+            raise
+        provider.stats.record(time.monotonic() - start, ok=True)
+        provider.breaker.record_success()
+        return result
+
+    def _invoke(self, provider, args, kwargs):
+        if not provider.breaker.try_acquire():
+            raise ProviderError("circuit open")
+        start = time.monotonic()
+        try:
+            result = provider.call(*args, **kwargs)
+        except RateLimited:
+            provider.breaker.release()
+            raise
+        except Exception:
+            provider.stats.record(time.monotonic() - start, ok=False)
+            provider.breaker.record_failure()
+            raise
+        provider.stats.record(time.monotonic() - start, ok=True)
+        provider.breaker.record_success()
+        return result
+
+    def status(self):
+        """Per-provider health snapshot for dashboards"""
+        return {
+            p.name: {
+                "state": p.breaker.state,
+                "latency": p.stats.latency(),
+                "error_rate": p.stats.error_rate(),
+                "available": p.available()
+            }
+            for p in self.providers
+        }
@@ -0,0 +1,231 @@
+import os
+import time
+import asyncio
+import heapq
+import itertools
+import threading
+import contextlib
+import contextvars
+
+from .provider_router import RateLimited
+from .metrics import metrics
+
+# Admission priorities; lower is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("tramibot_request_priority", default=INTERACTIVE)
+
+@contextlib.contextmanager
+def priority(level):
+    """Run the with-block's AI calls at this admission priority
+
+    Worker pools started inside the block must run their tasks in a copy of
+    the context (contextvars.copy_context().run) to inherit it.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+class TokenBucket:
+    """rate units per second refill, up to capacity; the caller holds the lock"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """Seconds until amount is available (0 when it already is)"""
+        # A request larger than the bucket still gets through once the bucket is full
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+class RateLimiter:
+    """Requests-per-second and tokens-per-minute budget for one provider
+
+    Callers queue by priority, then arrival order; only the head of the queue
+    takes from the buckets, so a background scan never overtakes a page
+    request. A request is shed straight away, with RateLimited, when the
+    queue is full or when the wait estimated from the queue ahead of it
+    exceeds max_wait for its priority, rather than timing out 30s later.
+    A 429 from the provider pauses admission for its Retry-After.
+    """
+
+    # How often queued coroutines re-check their place in line
+    ASYNC_POLL_INTERVAL = 0.05
+
+    def __init__(self, name, requests_per_second, burst=None, tokens_per_minute=0, max_queue=32,
+                 max_wait=None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_second, burst or max(1, requests_per_second))
+        # 0 disables the token budget
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait or {INTERACTIVE: 5.0, BACKGROUND: 60.0}
+        self.paused_until = 0.0
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name, requests_per_second, burst=5, tokens_per_minute=0):
+        """Limiter whose defaults can be overridden with TRAMIBOT_<NAME>_RPS, _BURST and _TPM"""
+        prefix = f"TRAMIBOT_{name.upper()}"
+        return cls(
+            name,
+            requests_per_second=float(os.getenv(f"{prefix}_RPS", requests_per_second)),
+            burst=float(os.getenv(f"{prefix}_BURST", burst)),
+            tokens_per_minute=int(os.getenv(f"{prefix}_TPM", tokens_per_minute)),
+            max_queue=int(os.getenv('TRAMIBOT_RATE_QUEUE_SIZE', 32)),
+            max_wait={
+                INTERACTIVE: float(os.getenv('TRAMIBOT_RATE_MAX_WAIT', 5)),
+                BACKGROUND: float(os.getenv('TRAMIBOT_RATE_MAX_WAIT_BACKGROUND', 60))
+            }
+        )
+
+    def acquire(self, tokens=0, level=None):
+        """Block until the request may be sent; raises RateLimited when it is shed"""
+        entry, label, deadline, started = self._enqueue(tokens, level)
+        with self._cond:
+            try:
+                while True:
+                    wait = self._poll(entry, label, deadline)
+                    if wait is None:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+            finally:
+                # The next request in line may be able to go now
+                self._cond.notify_all()
+        self._admitted(label, started)
+
+    async def acquire_async(self, tokens=0, level=None):
+        """Coroutine version of acquire(); waits without holding a thread"""
+        entry, label, deadline, started = self._enqueue(tokens, level)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._poll(entry, label, deadline)
+                    if wait is None:
+                        self._cond.notify_all()
+                        break
+                # notify_all() only wakes threads, so coroutines poll
+                await asyncio.sleep(min(wait, self.ASYNC_POLL_INTERVAL))
+        except BaseException:
+            with self._cond:
+                self._dequeue(entry)
+                self._cond.notify_all()
+            raise
+        self._admitted(label, started)
+
+    def backoff(self, seconds):
+        """Stop admitting requests for a while, e.g. after an HTTP 429"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            # Whatever burst was left is clearly not available upstream
+            self.requests.level = min(self.requests.level, 0)
+
+    def status(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "queued": len(self._queue),
+                "paused_for": round(max(0.0, self.paused_until - now), 1),
+                "requests_available": round(self.requests.level, 2),
+                "tokens_available": round(self.tokens.level) if self.tokens else None
+            }
+
+    def _enqueue(self, tokens, level):
+        """Queue a request, or shed it straight away; returns what _poll() needs"""
+        level = current_priority() if level is None else level
+        label = PRIORITY_NAMES.get(level, str(level))
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if len(self._queue) >= self.max_queue:
+                self._shed(label, "queue_full", f"{len(self._queue)} requests already queued")
+            estimate = self._estimated_wait(now, tokens, level)
+            if estimate > self.max_wait[level]:
+                self._shed(label, "over_budget", f"estimated wait {estimate:.1f}s", retry_after=estimate)
+            entry = (level, next(self._order), tokens)
+            heapq.heappush(self._queue, entry)
+        return entry, label, now + self.max_wait[level], now
+
+    def _poll(self, entry, label, deadline):
+        """Admit entry if it is at the head and the buckets allow; else seconds to wait
+
+        Caller holds the lock. Returns None once admitted and raises
+        RateLimited when the deadline has passed.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        wait = self._head_wait(now) if self._queue[0] is entry else None
+        if wait == 0:
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(entry[2])
+            return None
+        if now >= deadline:
+            self._shed(label, "timeout", f"not admitted within {self.max_wait[entry[0]]:.0f}s")
+        return min(wait, deadline - now) if wait is not None else deadline - now
+
+    def _dequeue(self, entry):
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+
+    def _admitted(self, label, started):
+        metrics.observe("tramibot_ai_admission_wait_seconds", time.monotonic() - started,
+                        help="Time AI requests spent waiting for a rate limit slot", provider=self.name, priority=label)
+        metrics.inc("tramibot_ai_admission_total", help="Rate limiter decisions",
+                    provider=self.name, priority=label, outcome="admitted")
+
+    def _refill(self, now):
+        self.requests.refill(now)
+        if self.tokens:
+            self.tokens.refill(now)
+
+    def _head_wait(self, now):
+        tokens = self._queue[0][2]
+        wait = max(self.paused_until - now, self.requests.time_until(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.time_until(tokens))
+        return wait
+
+    def _estimated_wait(self, now, tokens, level):
+        """Rough wait for a new request: everything queued at its priority or better goes first"""
+        ahead = [entry for entry in self._queue if entry[0] <= level]
+        wait = max(0.0, self.paused_until - now)
+        wait = max(wait, (len(ahead) + 1 - self.requests.level) / self.requests.rate)
+        if self.tokens:
+            needed = sum(entry[2] for entry in ahead) + tokens
+            wait = max(wait, (needed - self.tokens.level) / self.tokens.rate)
+        return wait
+
+    def _shed(self, label, outcome, detail, retry_after=None):
+        metrics.inc("tramibot_ai_admission_total", help="Rate limiter decisions",
+                    provider=self.name, priority=label, outcome=outcome)
+        raise RateLimited(f"{self.name} busy: {detail}", retry_after=retry_after)
+
+def estimate_tokens(prompt, max_tokens=0):
+    """Prompt tokens (about 4 characters each) plus the completion budget"""
+    return len(prompt) // 4 + max_tokens
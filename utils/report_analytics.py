@@ -0,0 +1,178 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .paths import data_path
+from .report_store import report_store, OFFICES, SUCCESS_PROCEDURES
+from .metrics import log_event
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MAX_WAIT_DAYS = 365
+# Below this many reports the dashboards fall back to general guidance
+MIN_REPORTS = 5
+
+class ReportAnalytics:
+    """Best-time aggregates over the community success reports
+
+    Every report is folded once into dense NumPy arrays indexed by office,
+    procedure, weekday and time-of-day slot, plus a wait-days histogram per
+    office and procedure. refresh() only reads reports newer than the last
+    one folded in, and the arrays are snapshotted to disk, so rendering never
+    rescans the report table. Queries sum over the axes they leave open.
+    """
+
+    def __init__(self, store=report_store, snapshot_path=None, slot_minutes=30):
+        self.store = store
+        self.snapshot_path = snapshot_path or os.getenv(
+            'TRAMIBOT_ANALYTICS_SNAPSHOT', data_path('report_analytics.npz')
+        )
+        self.slot_minutes = slot_minutes
+        self.slots = 24 * 60 // slot_minutes
+        self._lock = threading.Lock()
+        self._reset()
+        self._load_snapshot()
+
+    def _reset(self):
+        shape = (len(OFFICES), len(SUCCESS_PROCEDURES))
+        self.counts = np.zeros(shape + (7, self.slots), dtype=np.int64)
+        self.wait_histogram = np.zeros(shape + (MAX_WAIT_DAYS + 1,), dtype=np.int64)
+        self.last_report_id = 0
+
+    def _load_snapshot(self):
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                # Option sets or slot width changed since the snapshot: rebuild
+                if (list(snapshot['offices']) != OFFICES or list(snapshot['procedures']) != SUCCESS_PROCEDURES
+                        or snapshot['counts'].shape != self.counts.shape):
+                    return
+                self.counts = snapshot['counts']
+                self.wait_histogram = snapshot['wait_histogram']
+                self.last_report_id = int(snapshot['last_report_id'])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def _save_snapshot(self):
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path, counts=self.counts, wait_histogram=self.wait_histogram,
+                last_report_id=self.last_report_id, offices=OFFICES, procedures=SUCCESS_PROCEDURES
+            )
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            log_event("analytics_snapshot_error", level="error", path=self.snapshot_path, error=e)
+
+    def refresh(self):
+        """Fold in reports stored since the last refresh; returns how many were added"""
+        with self._lock:
+            db = self.store.db
+            newest = db.execute("SELECT COALESCE(MAX(id), 0) FROM success_reports").fetchone()[0]
+            if newest < self.last_report_id:
+                # The database was replaced; start over
+                self._reset()
+            if newest == self.last_report_id:
+                return 0
+            reports = pd.read_sql_query(
+                "SELECT id, office, procedure, weekday, minute_of_day, wait_days FROM success_reports WHERE id > ?",
+                db, params=(self.last_report_id,)
+            )
+            self._fold(reports)
+            self.last_report_id = int(reports['id'].max())
+            self._save_snapshot()
+            return len(reports)
+
+    def _fold(self, reports):
+        offices = pd.Categorical(reports['office'], categories=OFFICES).codes
+        procedures = pd.Categorical(reports['procedure'], categories=SUCCESS_PROCEDURES).codes
+        # Rows from an older option set have no column to land in
+        known = (offices >= 0) & (procedures >= 0)
+        offices, procedures = offices[known], procedures[known]
+        weekdays = reports['weekday'].to_numpy()[known]
+        slots = reports['minute_of_day'].to_numpy()[known] // self.slot_minutes
+        waits = np.clip(reports['wait_days'].to_numpy()[known], 0, MAX_WAIT_DAYS)
+        np.add.at(self.counts, (offices, procedures, weekdays, slots), 1)
+        np.add.at(self.wait_histogram, (offices, procedures, waits), 1)
+
+    def _select(self, array, office=None, procedure=None):
+        """Sum array over the office and procedure axes that are not fixed"""
+        if office is not None:
+            array = array[OFFICES.index(office)][None]
+        if procedure is not None:
+            array = array[:, SUCCESS_PROCEDURES.index(procedure)][:, None]
+        return array.sum(axis=(0, 1))
+
+    def slot_label(self, slot):
+        minutes = slot * self.slot_minutes
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def total_reports(self, office=None, procedure=None):
+        with self._lock:
+            return int(self._select(self.counts, office, procedure).sum())
+
+    def best_windows(self, office=None, procedure=None, top_n=3):
+        """Weekday and time slots with the most successes, as a DataFrame
+
+        probability is the share of this selection's successes that were
+        found in the slot.
+        """
+        with self._lock:
+            counts = self._select(self.counts, office, procedure)
+        total = counts.sum()
+        flat = counts.ravel()
+        order = np.argsort(flat, kind='stable')[::-1][:top_n]
+        order = order[flat[order] > 0]
+        weekdays, slots = np.divmod(order, self.slots)
+        return pd.DataFrame({
+            'weekday': [WEEKDAYS[day] for day in weekdays],
+            'time': [self.slot_label(slot) for slot in slots],
+            'reports': flat[order],
+            'probability': flat[order] / total if total else np.zeros(len(order))
+        })
+
+    def weekday_profile(self, office=None, procedure=None):
+        """Share of successes per weekday, split into mornings (before 14:00) and afternoons"""
+        with self._lock:
+            counts = self._select(self.counts, office, procedure)
+        split = 14 * 60 // self.slot_minutes
+        total = max(counts.sum(), 1)
+        return pd.DataFrame({
+            'morning': counts[:, :split].sum(axis=1) / total,
+            'afternoon': counts[:, split:].sum(axis=1) / total
+        }, index=WEEKDAYS)
+
+    def median_wait_days(self, office=None, procedure=None):
+        """Median days looking before success, or None without reports"""
+        with self._lock:
+            histogram = self._select(self.wait_histogram, office, procedure)
+        cumulative = np.cumsum(histogram)
+        if cumulative[-1] == 0:
+            return None
+        return int(np.argmax(cumulative * 2 >= cumulative[-1]))
+
+    def office_summary(self, procedure=None):
+        """One row per office with reports: volume, best slot, its share and the median wait"""
+        with self._lock:
+            counts = self.counts if procedure is None else self.counts[:, [SUCCESS_PROCEDURES.index(procedure)]]
+            waits = (self.wait_histogram if procedure is None
+                     else self.wait_histogram[:, [SUCCESS_PROCEDURES.index(procedure)]])
+            counts = counts.sum(axis=1).reshape(len(OFFICES), -1)
+            waits = waits.sum(axis=1)
+        totals = counts.sum(axis=1)
+        best = counts.argmax(axis=1)
+        weekdays, slots = np.divmod(best, self.slots)
+        cumulative = np.cumsum(waits, axis=1)
+        medians = np.argmax(cumulative * 2 >= cumulative[:, -1:], axis=1)
+        summary = pd.DataFrame({
+            'office': OFFICES,
+            'reports': totals,
+            'best_weekday': [WEEKDAYS[day] for day in weekdays],
+            'best_time': [self.slot_label(slot) for slot in slots],
+            'probability': counts.max(axis=1) / np.maximum(totals, 1),
+            'median_wait_days': medians
+        })
+        return summary[summary['reports'] > 0].sort_values('reports', ascending=False, ignore_index=True)
+
+# Shared instance: aggregates are kept per process and restored from the snapshot
+report_analytics = ReportAnalytics()
@@ -0,0 +1,236 @@
+import os
+import time
+import atexit
+import datetime
+import threading
+from collections import deque
+
+from .paths import data_path
+from .update_store import ThreadLocalConnection
+from .metrics import metrics, log_event
+
+# Closed option sets offered by the report forms
+OFFICES = ["Barcelona Police (Via Júlia)", "Barcelona Extranjería", "Girona", "Tarragona", "Lleida", "Other"]
+SUCCESS_PROCEDURES = ["NIE Application", "TIE Card", "Residence Renewal", "Empadronamiento", "Other"]
+MONITORED_PROCEDURES = [
+    "NIE Applications",
+    "TIE Card Processing",
+    "EU Residence Registration",
+    "Family Reunification",
+    "Student Visas",
+    "Work Permits",
+    "Long-Term Residence",
+    "Nationality Applications"
+]
+UPDATE_TYPES = ["Processing Time Change", "Requirement Change", "Fee Change", "New Procedure", "Other"]
+
+MAX_TEXT_LENGTH = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS success_reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    office TEXT NOT NULL,
+    procedure TEXT NOT NULL,
+    found_at TEXT NOT NULL,
+    weekday INTEGER NOT NULL,
+    minute_of_day INTEGER NOT NULL,
+    wait_days INTEGER NOT NULL,
+    strategy TEXT,
+    tips TEXT,
+    submitted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_success_reports_office ON success_reports (office, procedure);
+
+CREATE TABLE IF NOT EXISTS update_reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    procedure TEXT NOT NULL,
+    update_type TEXT NOT NULL,
+    noticed_on TEXT NOT NULL,
+    confidence INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    source TEXT,
+    submitted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_update_reports_procedure ON update_reports (procedure, submitted_at);
+"""
+
+SUCCESS_COLUMNS = ("office", "procedure", "found_at", "weekday", "minute_of_day", "wait_days", "strategy", "tips", "submitted_at")
+UPDATE_COLUMNS = ("procedure", "update_type", "noticed_on", "confidence", "description", "source", "submitted_at")
+
+class ReportValidationError(ValueError):
+    """A community report that cannot be stored; the message is shown to the user"""
+
+def _choice(value, options, field):
+    if value not in options:
+        raise ReportValidationError(f"Unknown {field}: {value!r}")
+    return value
+
+def _text(value, field, required=False):
+    value = (value or "").strip()
+    if required and not value:
+        raise ReportValidationError(f"Please fill in the {field}.")
+    if len(value) > MAX_TEXT_LENGTH:
+        raise ReportValidationError(f"The {field} is too long (max {MAX_TEXT_LENGTH} characters).")
+    return value
+
+def _past_date(value, field):
+    if not isinstance(value, datetime.date):
+        raise ReportValidationError(f"Invalid {field}.")
+    if value > datetime.date.today():
+        raise ReportValidationError(f"The {field} cannot be in the future.")
+    return value
+
+def validate_success_report(office, procedure, found_date, found_time, wait_days, strategy="", tips=""):
+    """Normalized success report row; raises ReportValidationError"""
+    found_date = _past_date(found_date, "date you found the appointment")
+    if not isinstance(found_time, datetime.time):
+        raise ReportValidationError("Invalid time.")
+    if not isinstance(wait_days, int) or not 0 <= wait_days <= 365:
+        raise ReportValidationError("Days looking must be between 0 and 365.")
+    found_at = datetime.datetime.combine(found_date, found_time.replace(second=0, microsecond=0))
+    return {
+        'office': _choice(office, OFFICES, "office"),
+        'procedure': _choice(procedure, SUCCESS_PROCEDURES, "procedure"),
+        'found_at': found_at.isoformat(),
+        'weekday': found_at.weekday(),
+        'minute_of_day': found_at.hour * 60 + found_at.minute,
+        'wait_days': wait_days,
+        'strategy': _text(strategy, "strategy"),
+        'tips': _text(tips, "tips"),
+        'submitted_at': datetime.datetime.now().isoformat()
+    }
+
+def validate_update_report(procedure, update_type, noticed_on, confidence, description, source=""):
+    """Normalized procedure-change report row; raises ReportValidationError"""
+    if not isinstance(confidence, int) or not 1 <= confidence <= 5:
+        raise ReportValidationError("Confidence must be between 1 and 5.")
+    return {
+        'procedure': _choice(procedure, MONITORED_PROCEDURES, "procedure"),
+        'update_type': _choice(update_type, UPDATE_TYPES, "update type"),
+        'noticed_on': _past_date(noticed_on, "date you noticed the change").isoformat(),
+        'confidence': confidence,
+        'description': _text(description, "description", required=True),
+        'source': _text(source, "source"),
+        'submitted_at': datetime.datetime.now().isoformat()
+    }
+
+class ReportStore:
+    """Community reports in SQLite behind an in-memory write buffer
+
+    Submitting only appends to a buffer; a single background thread commits
+    the buffer every flush_interval seconds or once batch_size reports are
+    waiting, with one transaction per batch. A burst of submissions therefore
+    never queues on the database write lock. Reads include reports that are
+    still buffered, so a submitter sees their own report straight away.
+    """
+
+    def __init__(self, path=None, batch_size=50, flush_interval=1.0):
+        self.path = path or os.getenv('TRAMIBOT_DB_PATH', data_path('tramibot.db'))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {'success_reports': deque(), 'update_reports': deque()}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._connections = ThreadLocalConnection(self.path, SCHEMA)
+        self.last_write_at = None
+
+    @property
+    def db(self):
+        return self._connections.get()
+
+    def submit_success_report(self, **fields):
+        """Validate and queue a success story; raises ReportValidationError"""
+        self._submit('success_reports', validate_success_report(**fields))
+
+    def submit_update_report(self, **fields):
+        """Validate and queue a procedure-change report; raises ReportValidationError"""
+        self._submit('update_reports', validate_update_report(**fields))
+
+    def _submit(self, table, row):
+        with self._pending_lock:
+            self._pending[table].append(row)
+            waiting = sum(len(rows) for rows in self._pending.values())
+        metrics.inc("tramibot_reports_submitted_total", help="Community reports accepted", kind=table)
+        self._ensure_writer()
+        if waiting >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, daemon=True, name="report-writer")
+                    self._writer.start()
+                    atexit.register(self.flush)
+
+    def _write_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log_event("report_flush_error", level="error", error=e)
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Commit every buffered report; rows stay buffered if the commit fails"""
+        with self._flush_lock:
+            with self._pending_lock:
+                batches = {table: list(rows) for table, rows in self._pending.items() if rows}
+            if not batches:
+                return 0
+            with self.db as conn:
+                for table, rows in batches.items():
+                    columns = SUCCESS_COLUMNS if table == 'success_reports' else UPDATE_COLUMNS
+                    conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        [tuple(row[column] for column in columns) for row in rows]
+                    )
+            with self._pending_lock:
+                for table, rows in batches.items():
+                    for _ in rows:
+                        self._pending[table].popleft()
+            written = sum(len(rows) for rows in batches.values())
+            metrics.observe("tramibot_report_batch_size", written, buckets=(1, 5, 10, 25, 50, 100, 250),
+                            help="Community reports per committed batch")
+            self.last_write_at = time.time()
+            return written
+
+    def recent_success_reports(self, limit=20, office=None):
+        return self._recent('success_reports', limit, "office", office)
+
+    def recent_update_reports(self, limit=20, procedure=None):
+        return self._recent('update_reports', limit, "procedure", procedure)
+
+    def _recent(self, table, limit, filter_column, value):
+        """Newest reports first, buffered ones included"""
+        query = f"SELECT * FROM {table}"
+        params = []
+        if value:
+            query += f" WHERE {filter_column} = ?"
+            params.append(value)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        # Not during a flush, or a report could be counted both buffered and stored
+        with self._flush_lock:
+            with self._pending_lock:
+                pending = [row for row in reversed(self._pending[table]) if not value or row[filter_column] == value]
+            stored = [dict(row) for row in self.db.execute(query, params).fetchall()]
+        return (pending + stored)[:limit]
+
+    def counts(self):
+        """Number of stored and buffered reports per kind"""
+        with self._flush_lock:
+            with self._pending_lock:
+                pending = {table: len(rows) for table, rows in self._pending.items()}
+            return {
+                table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] + pending[table]
+                for table in pending
+            }
+
+# Shared instance: one write buffer per process
+report_store = ReportStore()
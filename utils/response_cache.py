@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from .paths import data_path
+from .metrics import metrics, log_event
+
+class ResponseCache:
+    """Disk-backed cache of AI responses, shared by every session and process"""
+
+    # Seconds a response stays valid, per prompt family
+    FAMILY_TTLS = {
+        "guide": 24 * 3600,             # procedure guides: refresh daily
+        "update_analysis": 7 * 24 * 3600,  # BOE entries don't change once published
+        "actions": 3 * 24 * 3600,       # recommended actions for an update
+        "default": 3600
+    }
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.getenv('TRAMIBOT_AI_CACHE_DIR', data_path('ai_cache'))
+        self.max_bytes = max_bytes or int(os.getenv('TRAMIBOT_AI_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        """Collapse whitespace so re-indented prompts share a key"""
+        return " ".join(prompt.split())
+
+    @classmethod
+    def make_key(cls, provider, model, prompt, params=None):
+        """Content address for a request: provider, model, prompt and parameters"""
+        payload = json.dumps({
+            "provider": provider,
+            "model": model,
+            "prompt": cls.normalize_prompt(prompt),
+            "params": params or {}
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, family="default"):
+        """Return the cached response or None when missing or expired"""
+        response = self._read(key, family)
+        self._count(hit=response is not None, family=family)
+        return response
+
+    def get_first(self, keys, family="default"):
+        """(key, response) for the first key with a cached response, or (None, None)
+
+        Counts as a single lookup in the stats, however many keys are tried.
+        """
+        for key in keys:
+            response = self._read(key, family)
+            if response is not None:
+                self._count(hit=True, family=family)
+                return key, response
+        self._count(hit=False, family=family)
+        return None, None
+
+    def set(self, key, response, family="default"):
+        """Store a response; writes are atomic so readers never see partial files"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({
+            "family": family,
+            "created_at": time.time(),
+            "response": response
+        }, ensure_ascii=False).encode('utf-8')
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log_event("ai_cache_write_error", level="error", path=path, error=e)
+            return
+
+        with self._lock:
+            total = self._current_size() + len(data) - previous
+            self._total_bytes = total
+            if total > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size_bytes": self._current_size()
+            }
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            self._remove(path)
+        with self._lock:
+            self._total_bytes = 0
+
+    def _read(self, key, family):
+        """Cached response or None when missing or expired; not counted"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        ttl = self.FAMILY_TTLS.get(entry.get('family', family), self.FAMILY_TTLS["default"])
+        if time.time() - entry.get('created_at', 0) > ttl:
+            self._expire(path, size)
+            return None
+
+        # Touch the file so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('response')
+
+    def _expire(self, path, size):
+        """Remove an expired response and take its size off the running total"""
+        if self._remove(path):
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes = max(0, self._total_bytes - size)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _count(self, hit, family="default"):
+        metrics.inc("tramibot_ai_cache_lookups_total", help="AI response cache lookups",
+                    family=family, result="hit" if hit else "miss")
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entries(self):
+        """Yield (path, size, last_used) for every cached response"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _current_size(self):
+        # Caller holds the lock; the directory is only scanned once per process
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._entries())
+        return self._total_bytes
+
+    def _evict(self):
+        """Drop least recently used responses until we are under 90% of the budget"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                self.evictions += 1
+        self._total_bytes = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+# Shared instance used by the AI clients
+response_cache = ResponseCache()
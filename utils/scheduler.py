@@ -1,6 +1,7 @@
 import schedule
 import time
-from ai_updater import LegalAIUpdater
+from .ai_updater import LegalAIUpdater
+from .update_store import save_updates
 
 def daily_update_job():
     """Run daily to check for updates"""
@@ -10,7 +11,7 @@ def daily_update_job():
     boe_updates = updater.check_boe_updates()
     procedure_changes = updater.monitor_procedure_changes()
     
-    # Save updates to database (implement this)
+    # Save updates to the SQLite store
     save_updates(boe_updates, procedure_changes)
 
 # Schedule daily checks
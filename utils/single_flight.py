@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and get the same result, or the same exception.
+    Nothing is remembered afterwards: that is the response cache's job, this
+    only covers the window before the first answer is cached.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return (result, shared); shared is True when another caller's in-flight call answered"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            # Unregister before waking followers, so later callers start a new flight
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Coroutine version of do(); fn is a coroutine function
+
+        Coalesces callers on the same event loop only, as a flight's future
+        belongs to the loop it was created on.
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = loop.create_future()
+
+        if not leader:
+            # shield: a follower that is cancelled must not cancel the shared call
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._flights[key]
+        return result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
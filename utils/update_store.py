@@ -0,0 +1,385 @@
+import os
+import json
+import hashlib
+import sqlite3
+import datetime
+import threading
+from email.utils import parsedate_to_datetime
+
+from .paths import data_path
+from .procedure_index import ProcedureIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS updates (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    date TEXT,
+    published_at TEXT,
+    title TEXT NOT NULL,
+    content TEXT,
+    link TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_updates_published ON updates (published_at);
+CREATE INDEX IF NOT EXISTS idx_updates_source ON updates (source, published_at);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    update_id TEXT PRIMARY KEY REFERENCES updates (id),
+    analysis TEXT NOT NULL,
+    urgency TEXT,
+    details TEXT,
+    created_at TEXT NOT NULL
+);
+
+-- Inverted index postings: which procedures each update affects
+CREATE TABLE IF NOT EXISTS update_procedures (
+    update_id TEXT NOT NULL REFERENCES updates (id),
+    procedure TEXT NOT NULL,
+    UNIQUE (update_id, procedure)
+);
+CREATE INDEX IF NOT EXISTS idx_update_procedures_procedure ON update_procedures (procedure);
+
+CREATE TABLE IF NOT EXISTS procedures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    procedure TEXT NOT NULL,
+    status TEXT,
+    requirements TEXT,
+    notes TEXT,
+    source TEXT,
+    checked_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_procedures_procedure ON procedures (procedure, checked_at);
+
+CREATE TABLE IF NOT EXISTS scan_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    stats TEXT,
+    update_ids TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scan_runs_source ON scan_runs (source, id);
+
+-- AI recommended actions, generated on request and kept per update
+CREATE TABLE IF NOT EXISTS update_actions (
+    update_id TEXT PRIMARY KEY REFERENCES updates (id),
+    actions TEXT NOT NULL,
+    analysis_version TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+def open_connection(path):
+    """SQLite connection in WAL mode so readers never wait for a writer"""
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class ThreadLocalConnection:
+    """One open_connection() per thread, since sqlite3 connections must not cross threads
+
+    The schema script, and migrate(conn) if given, run on the first
+    connection only.
+    """
+
+    def __init__(self, path, schema, migrate=None):
+        self.path = path
+        self.schema = schema
+        self.migrate = migrate
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_connection(self.path)
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(self.schema)
+                    if self.migrate:
+                        self.migrate(conn)
+                    self._schema_ready = True
+        return conn
+
+class UpdateStore:
+    """SQLite store for official updates, their analyses, procedure checks and scan runs
+
+    Written by the background worker and the daily scheduler, read by the pages.
+    WAL mode lets page reads run while a scan is being written.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('TRAMIBOT_DB_PATH', data_path('tramibot.db'))
+        self._connections = ThreadLocalConnection(self.path, SCHEMA, self._migrate)
+        self._latest = {}
+        self.procedure_index = ProcedureIndex()
+
+    @property
+    def db(self):
+        """Per-thread connection"""
+        return self._connections.get()
+
+    @staticmethod
+    def _migrate(conn):
+        """Add columns introduced after a database was first created"""
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(analyses)")}
+        with conn:
+            for column in ("urgency", "details"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE analyses ADD COLUMN {column} TEXT")
+
+    def save_scan(self, updates, started_at, source="BOE", stats=None):
+        """Store a completed scan (updates with their analyses) in one transaction; returns the scan ID"""
+        now = datetime.datetime.now().isoformat()
+        with self.db as conn:
+            self._upsert_updates(conn, updates, source, now)
+            self._index_updates(conn, updates)
+            conn.executemany(
+                """INSERT INTO analyses (update_id, analysis, urgency, details, created_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (update_id) DO UPDATE SET
+                       analysis = excluded.analysis, urgency = excluded.urgency,
+                       details = excluded.details, created_at = excluded.created_at
+                   WHERE analyses.analysis != excluded.analysis""",
+                [
+                    (
+                        self.update_id(u),
+                        u['ai_analysis'],
+                        u.get('urgency'),
+                        json.dumps({
+                            'affected_procedures': u.get('affected_procedures', []),
+                            'key_changes': u.get('key_changes', [])
+                        }, ensure_ascii=False),
+                        now
+                    )
+                    # A fallback answer is no analysis; the entry is retried by the next scan
+                    for u in updates if u.get('ai_analysis') and not u.get('is_fallback')
+                ]
+            )
+            cursor = conn.execute(
+                "INSERT INTO scan_runs (source, started_at, finished_at, stats, update_ids) VALUES (?, ?, ?, ?, ?)",
+                (source, started_at, now, json.dumps(stats or {}), json.dumps([self.update_id(u) for u in updates]))
+            )
+        return cursor.lastrowid
+
+    def save_procedure_checks(self, procedure_changes, conn=None):
+        """Append one row per procedure check so requirement changes can be traced over time"""
+        rows = [
+            (
+                change.get('procedure', ''),
+                change.get('status'),
+                json.dumps(change.get('requirements', []), ensure_ascii=False),
+                change.get('notes'),
+                change.get('source'),
+                change.get('last_checked') or datetime.datetime.now().isoformat()
+            )
+            for change in procedure_changes if isinstance(change, dict)
+        ]
+        sql = """INSERT INTO procedures (procedure, status, requirements, notes, source, checked_at)
+                 VALUES (?, ?, ?, ?, ?, ?)"""
+        if conn is not None:
+            # Part of the caller's transaction
+            conn.executemany(sql, rows)
+            return
+        with self.db as db:
+            db.executemany(sql, rows)
+
+    def latest_scan_id(self, source="BOE"):
+        """ID of the last completed scan, or None; a cheap check before re-reading a scan"""
+        row = self.db.execute(
+            "SELECT id FROM scan_runs WHERE source = ? ORDER BY id DESC LIMIT 1", (source,)
+        ).fetchone()
+        return row['id'] if row else None
+
+    def latest_scan(self, source="BOE"):
+        """The last completed scan with its updates in scan order, or None before the first one"""
+        run = self.db.execute(
+            "SELECT * FROM scan_runs WHERE source = ? ORDER BY id DESC LIMIT 1", (source,)
+        ).fetchone()
+        if run is None:
+            return None
+        cached = self._latest.get(source)
+        if cached and cached['scan_id'] == run['id']:
+            return cached
+
+        update_ids = json.loads(run['update_ids'])
+        by_id = {update['id']: update for update in self.get_updates(update_ids)}
+        scan = {
+            'scan_id': run['id'],
+            'source': run['source'],
+            'started_at': run['started_at'],
+            'finished_at': run['finished_at'],
+            'stats': json.loads(run['stats'] or '{}'),
+            'updates': [by_id[update_id] for update_id in update_ids if update_id in by_id]
+        }
+        self._latest[source] = scan
+        return scan
+
+    def get_updates(self, update_ids, limit=-1):
+        """Updates (with their analysis) for the given IDs, newest first"""
+        if not update_ids:
+            return []
+        placeholders = ",".join("?" * len(update_ids))
+        rows = self.db.execute(
+            f"""SELECT u.*, a.analysis, a.urgency, a.details FROM updates u LEFT JOIN analyses a ON a.update_id = u.id
+                WHERE u.id IN ({placeholders}) ORDER BY u.published_at DESC LIMIT ?""",
+            [*update_ids, limit]
+        ).fetchall()
+        return [self._row_to_update(row) for row in rows]
+
+    def recent_updates(self, limit=50, source=None, since=None):
+        """Most recent updates by publication date, optionally for one source or after an ISO date"""
+        query = "SELECT u.*, a.analysis, a.urgency, a.details FROM updates u LEFT JOIN analyses a ON a.update_id = u.id WHERE 1=1"
+        params = []
+        if source:
+            query += " AND u.source = ?"
+            params.append(source)
+        if since:
+            query += " AND u.published_at >= ?"
+            params.append(since)
+        query += " ORDER BY u.published_at DESC LIMIT ?"
+        params.append(limit)
+        return [self._row_to_update(row) for row in self.db.execute(query, params).fetchall()]
+
+    def updates_for_procedure(self, procedure_name, limit=10):
+        """Most recent updates affecting a procedure, via the inverted index"""
+        rows = self.db.execute(
+            """SELECT u.*, a.analysis, a.urgency, a.details FROM update_procedures p
+                JOIN updates u ON u.id = p.update_id LEFT JOIN analyses a ON a.update_id = u.id
+                WHERE p.procedure = ? ORDER BY u.published_at DESC LIMIT ?""",
+            (self.procedure_index.canonical(procedure_name), limit)
+        ).fetchall()
+        return [self._row_to_update(row) for row in rows]
+
+    def _index_updates(self, conn, updates):
+        conn.executemany(
+            "INSERT OR IGNORE INTO update_procedures (update_id, procedure) VALUES (?, ?)",
+            [
+                (self.update_id(u), procedure)
+                for u in updates
+                for procedure in self.procedure_index.procedures_for(u)
+            ]
+        )
+
+    def procedure_history(self, procedure, limit=20):
+        rows = self.db.execute(
+            "SELECT * FROM procedures WHERE procedure = ? ORDER BY checked_at DESC LIMIT ?",
+            (procedure, limit)
+        ).fetchall()
+        return [dict(row, requirements=json.loads(row['requirements'] or '[]')) for row in rows]
+
+    @staticmethod
+    def update_id(update):
+        return update.get('id') or update.get('link') or update['title']
+
+    @staticmethod
+    def analysis_version(update):
+        """Fingerprint of what recommended actions are written from"""
+        text = f"{update['title']}\n{update.get('ai_analysis', '')}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+    def actions_for(self, updates):
+        """Stored recommended actions by update ID, for updates whose analysis is unchanged"""
+        versions = {self.update_id(u): self.analysis_version(u) for u in updates}
+        if not versions:
+            return {}
+        rows = self.db.execute(
+            f"SELECT update_id, actions, analysis_version FROM update_actions "
+            f"WHERE update_id IN ({', '.join('?' * len(versions))})",
+            list(versions)
+        ).fetchall()
+        return {
+            row['update_id']: row['actions'] for row in rows
+            if row['analysis_version'] == versions[row['update_id']]
+        }
+
+    def save_actions(self, update, actions):
+        with self.db as conn:
+            conn.execute(
+                """INSERT INTO update_actions (update_id, actions, analysis_version, created_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (update_id) DO UPDATE SET
+                       actions = excluded.actions, analysis_version = excluded.analysis_version,
+                       created_at = excluded.created_at""",
+                (self.update_id(update), actions, self.analysis_version(update), datetime.datetime.now().isoformat())
+            )
+
+    def _upsert_updates(self, conn, updates, source, now, refresh=True):
+        """Insert new updates; with refresh=False existing rows only get last_seen bumped
+
+        The daily check only has truncated summaries, so it must not overwrite
+        the full text stored by an analysis scan.
+        """
+        if refresh:
+            on_conflict = """title = excluded.title, content = excluded.content, link = excluded.link,
+                   date = excluded.date, published_at = excluded.published_at, last_seen = excluded.last_seen"""
+        else:
+            on_conflict = "last_seen = excluded.last_seen"
+        conn.executemany(
+            f"""INSERT INTO updates (id, source, date, published_at, title, content, link, first_seen, last_seen)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (id) DO UPDATE SET {on_conflict}""",
+            [
+                (
+                    self.update_id(u),
+                    u.get('source', source),
+                    u.get('date'),
+                    self._published_at(u.get('date')),
+                    u['title'],
+                    u.get('content') or u.get('summary'),
+                    u.get('link'),
+                    now,
+                    now
+                )
+                for u in updates
+            ]
+        )
+
+    @staticmethod
+    def _published_at(date):
+        """RSS dates (RFC 822) as sortable ISO strings"""
+        if not date:
+            return None
+        try:
+            return parsedate_to_datetime(date).isoformat()
+        except (TypeError, ValueError):
+            return date
+
+    @staticmethod
+    def _row_to_update(row):
+        details = json.loads(row['details'] or '{}')
+        return {
+            'id': row['id'],
+            'source': row['source'],
+            'date': row['date'],
+            'title': row['title'],
+            'content': row['content'],
+            'link': row['link'],
+            'ai_analysis': row['analysis'] or '',
+            'urgency': row['urgency'] or 'unknown',
+            'affected_procedures': details.get('affected_procedures', []),
+            'key_changes': details.get('key_changes', [])
+        }
+
+# Shared instance for the worker, the scheduler and the pages
+update_store = UpdateStore()
+
+def save_updates(boe_updates, procedure_changes, store=None):
+    """Persist a daily check: BOE updates and procedure checks in a single transaction"""
+    store = store or update_store
+    started_at = datetime.datetime.now().isoformat()
+    with store.db as conn:
+        store._upsert_updates(conn, boe_updates, "BOE", started_at, refresh=False)
+        store._index_updates(conn, boe_updates)
+        store.save_procedure_checks(procedure_changes, conn)
+        conn.execute(
+            "INSERT INTO scan_runs (source, started_at, finished_at, stats, update_ids) VALUES (?, ?, ?, ?, ?)",
+            (
+                "daily_check", started_at, datetime.datetime.now().isoformat(),
+                json.dumps({'boe_updates': len(boe_updates), 'procedure_checks': len(procedure_changes)}),
+                json.dumps([store.update_id(u) for u in boe_updates])
+            )
+        )
@@ -0,0 +1,88 @@
+"""Background worker: scans official sources on a schedule and stores the results
+
+Run it next to the Streamlit app so pages only read finished scans:
+
+    python -m utils.update_worker          # scan every TRAMIBOT_SCAN_INTERVAL seconds
+    python -m utils.update_worker --once   # single scan, e.g. from cron
+
+With --warm-guides K, the K most requested procedure guides are refreshed
+after every scan, so guides affected by new updates are ready before users ask.
+With --precompute-actions N, the Live Updates "AI Recommended Actions" of the
+N newest updates are generated up front instead of on the first click.
+"""
+import os
+import time
+import datetime
+import argparse
+
+from . import ai_core
+from .update_store import update_store
+from .cache_generation import invalidate_caches
+from .metrics import metrics, log_event
+from .guide_warmer import warm_guides, combos_to_warm
+from .rate_limiter import priority, BACKGROUND
+
+def run_scan(ai=None, store=update_store):
+    """Scan the BOE feed, analyze new entries and store the result; returns the scan ID"""
+    ai = ai or ai_core.immigration_ai
+    started_at = datetime.datetime.now().isoformat()
+    stats = {}
+    # Page requests are admitted to the AI providers first
+    with priority(BACKGROUND), metrics.timer("tramibot_scan_seconds", help="Background scan duration"):
+        scanned = dict(ai.iter_scan(parallel=True, batch=True, stats=stats))
+    updates = [scanned[index] for index in sorted(scanned)]
+    scan_id = store.save_scan(updates, started_at, stats=stats)
+    # Pages pick up the new scan on their next rerun
+    invalidate_caches()
+    print(f"Scan {scan_id} stored: {len(updates)} updates, {stats}")
+    return scan_id
+
+def run_warm(top_k):
+    if top_k:
+        print(f"Guides warmed: {warm_guides(combos_to_warm(top_k))}")
+
+def run_actions(limit, ai=None, store=update_store):
+    """Generate the missing recommended actions for the newest updates of the latest scan"""
+    ai = ai or ai_core.immigration_ai
+    scan = store.latest_scan() if limit else None
+    if scan:
+        with priority(BACKGROUND):
+            generated = ai.precompute_actions(scan['updates'][:limit])
+        print(f"Recommended actions generated: {generated}")
+
+def run_forever(interval, warm_top_k=0, actions_limit=0):
+    while True:
+        started = time.monotonic()
+        try:
+            run_scan()
+            run_warm(warm_top_k)
+            run_actions(actions_limit)
+        except Exception as e:
+            log_event("worker_scan_error", level="error", error=e)
+            metrics.inc("tramibot_scan_failures_total", help="Background scans that raised")
+        metrics.write_textfile()
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tramibot background update worker")
+    parser.add_argument("--once", action="store_true", help="run a single scan and exit")
+    parser.add_argument("--interval", type=int, default=int(os.getenv('TRAMIBOT_SCAN_INTERVAL', 900)),
+                        help="seconds between scans (default: 900)")
+    parser.add_argument("--warm-guides", type=int, default=int(os.getenv('TRAMIBOT_WARM_GUIDES', 0)), metavar="K",
+                        help="refresh the K most requested procedure guides after each scan (default: 0, off)")
+    parser.add_argument("--precompute-actions", type=int, default=int(os.getenv('TRAMIBOT_PRECOMPUTE_ACTIONS', 0)),
+                        metavar="N", help="generate recommended actions for the N newest updates after each scan "
+                                          "(default: 0, on demand only)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv('TRAMIBOT_METRICS_PORT', 0)),
+                        help="serve Prometheus metrics on this port (default: off; a textfile is written after each scan)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.once:
+        run_scan()
+        run_warm(args.warm_guides)
+        run_actions(args.precompute_actions)
+        metrics.write_textfile()
+    else:
+        run_forever(args.interval, args.warm_guides, args.precompute_actions)